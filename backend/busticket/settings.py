@@ -48,7 +48,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -56,14 +56,38 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    # Uses orjson when installed, otherwise the same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Access tokens carry the profile, so authentication needs no user lookup
+    'TOKEN_OBTAIN_SERIALIZER': 'core.authentication.ProfileTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.authentication.ProfileTokenRefreshSerializer',
 }
+
+# How long a process trusts its last check that a token's user is still
+# active, i.e. how long a deactivated user keeps access; 0 trusts the token
+# alone until it expires (ACCESS_TOKEN_LIFETIME). Staff rights are not
+# delayed: staff-only paths re-read is_staff from the database every time.
+JWT_USER_CACHE_SECONDS = config('JWT_USER_CACHE_SECONDS', default=0, cast=int)
+
+# How long a seat hold from /api/bookings/hold/ reserves seats before it expires
+SEAT_HOLD_MINUTES = config('SEAT_HOLD_MINUTES', default=10, cast=int)
+
+# Most items accepted by one bulk cancel or batch booking request
+BOOKING_BATCH_MAX = config('BOOKING_BATCH_MAX', default=100, cast=int)
+
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this for static files
     'corsheaders.middleware.CorsMiddleware',  # Add this line
@@ -120,6 +144,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock at BEGIN so concurrent bookings queue on the
+        # busy timeout instead of failing with "database is locked".
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file-backed test database lets threaded tests share real locks;
+        # the in-memory shared cache fails fast with "table is locked".
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -128,6 +163,60 @@ if config('DATABASE_URL', default=None):
     import dj_database_url
     DATABASES['default'] = dj_database_url.parse(config('DATABASE_URL'))
 
+# Cache (locmem by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached in production so all workers share cached search results)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='busticket'),
+    }
+}
+
+# Seconds a cached route search response is kept
+SEARCH_CACHE_TIMEOUT = config('SEARCH_CACHE_TIMEOUT', default=300, cast=int)
+
+# Longest a process serves city/operator/bus reference data saved by another process
+REFERENCE_CACHE_SECONDS = config('REFERENCE_CACHE_SECONDS', default=300, cast=int)
+
+# Connection search: shortest and longest wait between legs, and how long a
+# process keeps its in-memory departure graph for a service date
+CONNECTION_MIN_LAYOVER_MINUTES = config('CONNECTION_MIN_LAYOVER_MINUTES', default=30, cast=int)
+CONNECTION_MAX_LAYOVER_MINUTES = config('CONNECTION_MAX_LAYOVER_MINUTES', default=12 * 60, cast=int)
+CONNECTION_GRAPH_SECONDS = config('CONNECTION_GRAPH_SECONDS', default=300, cast=int)
+
+# Longest range the fare calendar endpoint returns, in days
+FARE_CALENDAR_MAX_DAYS = config('FARE_CALENDAR_MAX_DAYS', default=90, cast=int)
+
+# Request instrumentation (core.middleware.PerformanceMiddleware): share of
+# requests logged to core.performance, the duration above which a request is
+# always logged with its SQL (0 disables), and the /api/metrics/ endpoint
+PERF_LOG_SAMPLE_RATE = config('PERF_LOG_SAMPLE_RATE', default=0.1, cast=float)
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=500, cast=int)
+PERF_METRICS_ENABLED = config('PERF_METRICS_ENABLED', default=False, cast=bool)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'performance': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': config('CORE_LOG_LEVEL', default='INFO'),
+        },
+        'core.performance': {
+            'handlers': ['performance'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -147,6 +236,23 @@ AUTH_PASSWORD_VALIDORS = [
 ]
 
 
+# pbkdf2_sha256 with a configurable cost (PASSWORD_HASH_ITERATIONS, 0 = Django's
+# default); hashes made with another cost are upgraded on the next login
+PASSWORD_HASHERS = [
+    'core.hashing.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=0, cast=int)
+
+# Registration hashes passwords on a per-process pool of this many threads;
+# once PASSWORD_HASH_QUEUE more are waiting, sign-ups get 503 until one finishes
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=8, cast=int)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from core.views import CityViewSet, BusOperatorViewSet, BusViewSet, RouteViewSet, SeatViewSet, BookingViewSet, RegisterView, ProfileView
+from core import async_views
+from core.views import CityViewSet, BusOperatorViewSet, BusViewSet, RouteViewSet, SeatViewSet, BookingViewSet, RegisterView, ProfileView, metrics_view
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
@@ -19,4 +21,11 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/profile/', ProfileView.as_view(), name='profile'),
-]
\ No newline at end of file
+    # Async (ASGI) versions of the hot read endpoints
+    path('api/async/cities/', async_views.city_list, name='async-city-list'),
+    path('api/async/routes/search/', async_views.route_search, name='async-route-search'),
+    path('api/async/seats/available/', async_views.available_seats, name='async-available-seats'),
+]
+
+if settings.PERF_METRICS_ENABLED:
+    urlpatterns.append(path('api/metrics/', metrics_view, name='metrics'))
@@ -1,11 +1,13 @@
 from django.contrib import admin
-from .models import City, BusOperator, Bus, Route, Seat, Booking, Passenger, UserProfile
+from .models import City, BusOperator, Bus, Route, Seat, RouteSeat, Booking, Passenger, UserProfile, FareCalendarDay
 
 admin.site.register(City)
 admin.site.register(BusOperator)
 admin.site.register(Bus)
 admin.site.register(Route)
 admin.site.register(Seat)
+admin.site.register(RouteSeat)
 admin.site.register(Booking)
 admin.site.register(Passenger)
-admin.site.register(UserProfile)
\ No newline at end of file
+admin.site.register(UserProfile)
+admin.site.register(FareCalendarDay)
@@ -0,0 +1,139 @@
+"""
+Async-native versions of the hot read endpoints.
+
+These are plain Django async views (DRF viewsets are sync-only) that talk to
+the database through the async ORM, so under an ASGI server such as uvicorn
+one worker can keep many slow searches in flight. Responses match the sync
+endpoints' payloads, pagination included (``{"next", "previous",
+"results"}``), except that cursors only page forward, so ``previous`` is
+always null.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+from .inventory import aroute_availability, unheld
+from .models import City, Route, Seat
+from .pagination import KeysetPagination
+from .reference_cache import reference_cache
+from .search import SearchParamError, parse_search_params, search_filter
+from .search_cache import compute_etag
+from .serializers import CitySerializer, RouteSerializer, SeatSerializer
+
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, cls=JSONEncoder).encode()).decode()
+
+
+def _decode_cursor(cursor, length):
+    """The ``length`` ordering values a cursor points after."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise SearchParamError("Invalid cursor.")
+    if (not isinstance(values, list) or len(values) != length
+            or not all(isinstance(value, (str, int, float)) for value in values)):
+        raise SearchParamError("Invalid cursor.")
+    return values
+
+
+def _page_size(request):
+    default = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        size = int(request.GET.get('page_size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, KeysetPagination.max_page_size))
+
+
+async def keyset_page(request, queryset, ordering, serializer_class, resolve=None):
+    """
+    Serialize one page of ``queryset`` ordered by ``ordering`` (ascending
+    fields ending with ``id``), positioned after the request's cursor.
+    ``resolve(rows)`` is awaited before serializing, to load what the
+    serializer would otherwise fetch with the sync ORM.
+    """
+    cursor = request.GET.get('cursor')
+    if cursor:
+        *leading, last_id = _decode_cursor(cursor, len(ordering))
+        after = Q(id__gt=last_id)
+        for field, value in reversed(list(zip(ordering, leading))):
+            after = Q(**{f'{field}__gt': value}) | (Q(**{field: value}) & after)
+        try:
+            queryset = queryset.filter(after)
+        except (ValueError, TypeError, ValidationError):
+            raise SearchParamError("Invalid cursor.")
+
+    size = _page_size(request)
+    rows = [row async for row in queryset.order_by(*ordering)[:size + 1].aiterator()]
+    next_url = None
+    if len(rows) > size:
+        rows = rows[:size]
+        position = [getattr(rows[-1], field) for field in ordering]
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', _encode_cursor(position))
+    if resolve is not None:
+        await resolve(rows)
+    return {'next': next_url, 'previous': None, 'results': serializer_class(rows, many=True).data}
+
+
+async def _resolve_route_references(routes):
+    cities = {city for route in routes for city in (route.source_id, route.destination_id)}
+    await reference_cache.aresolve('city', cities)
+    await reference_cache.aresolve('bus', {route.bus_id for route in routes})
+    buses = reference_cache.table('bus')
+    operators = {buses[route.bus_id]['operator_id'] for route in routes if route.bus_id in buses}
+    await reference_cache.aresolve('operator', operators)
+
+
+@require_GET
+async def city_list(request):
+    try:
+        data = await keyset_page(request, City.objects.all(), ('name', 'id'), CitySerializer)
+    except SearchParamError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(data, encoder=JSONEncoder)
+
+
+@require_GET
+async def available_seats(request):
+    route_id = request.GET.get('route_id')
+    if not route_id or not route_id.isdigit():
+        return JsonResponse({'error': 'Route ID required.'}, status=400)
+    queryset = Seat.objects.filter(
+        unheld(prefix='trip_inventory__'),
+        trip_inventory__route_id=route_id,
+        trip_inventory__is_booked=False,
+    )
+    try:
+        data = await keyset_page(request, queryset, ('id',), SeatSerializer)
+    except SearchParamError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(data, encoder=JSONEncoder)
+
+
+@require_GET
+async def route_search(request):
+    try:
+        source, destination, date, tz = parse_search_params(request.GET)
+        queryset = Route.objects.filter(**search_filter(source, destination, date, tz))
+        data = await keyset_page(request, queryset, ('departure_time', 'id'), RouteSerializer,
+                                 resolve=_resolve_route_references)
+    except SearchParamError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    counts = await aroute_availability([route['id'] for route in data['results']])
+    no_seats = {'available_seats': 0, 'booked_seats': 0}
+    data['results'] = [dict(route, **counts.get(route['id'], no_seats)) for route in data['results']]
+
+    etag = compute_etag(data)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return HttpResponse(status=304, headers={'ETag': etag})
+    return JsonResponse(data, encoder=JSONEncoder, headers={'ETag': etag})
@@ -0,0 +1,130 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's profile as claims (username, email, is_staff,
+phone and address), set when a token pair is issued and re-read from the
+database on every refresh. ClaimsJWTAuthentication trusts the signed token
+and returns simplejwt's TokenUser without touching the database, so views
+use ``request.user.id`` for lookups and the profile endpoint answers GETs
+from the claims.
+
+With JWT_USER_CACHE_SECONDS above zero, the user's active flag is also
+checked, at most once per user per interval in each process, so a
+deactivated account is locked out within that interval instead of when its
+token expires.
+
+The is_staff claim is not trusted on its own: staff-only paths use
+IsCurrentStaff or staff_confirmed, which check the database, so revoking
+staff takes effect on the next request.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAdminUser
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+PROFILE_CLAIMS = ('username', 'email', 'is_staff', 'phone', 'address')
+MAX_CACHED_USERS = 10_000
+
+
+def profile_claims(user):
+    try:
+        profile = user.userprofile
+    except ObjectDoesNotExist:
+        profile = None
+    return {
+        'username': user.username,
+        'email': user.email,
+        'is_staff': user.is_staff,
+        'phone': profile.phone if profile else '',
+        'address': profile.address if profile else '',
+    }
+
+
+def staff_confirmed(user):
+    """Whether ``user`` is active staff now, not only when its token was issued (one query for staff tokens)."""
+    if not user.is_staff:
+        return False
+    return User.objects.filter(id=user.id, is_staff=True, is_active=True).exists()
+
+
+class IsCurrentStaff(IsAdminUser):
+    """IsAdminUser with the staff flag read from the database instead of the token."""
+
+    def has_permission(self, request, view):
+        return super().has_permission(request, view) and staff_confirmed(request.user)
+
+
+def access_token_for(user):
+    """A fresh access token for ``user`` carrying the current profile claims."""
+    token = AccessToken.for_user(user)
+    token.payload.update(profile_claims(user))
+    return token
+
+
+class ProfileTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Copied into every access token made from this refresh token
+        token.payload.update(profile_claims(user))
+        return token
+
+
+class ProfileTokenRefreshSerializer(TokenRefreshSerializer):
+    """Issue the new access token with profile claims read now, not when the refresh token was made."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = (
+            User.objects.select_related('userprofile')
+            .filter(**{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)})
+            .first()
+        )
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        refresh.payload.update(profile_claims(user))
+        return {'access': str(refresh.access_token)}
+
+
+class _ActiveUserCache:
+    """Process-local ``user_id -> (checked_at, is_active)`` with a TTL and a size bound."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def is_active(self, user_id, ttl):
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[0] >= ttl:
+            active = User.objects.filter(id=user_id, is_active=True).exists()
+            with self._lock:
+                self._entries[user_id] = entry = (time.monotonic(), active)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > MAX_CACHED_USERS:
+                    self._entries.popitem(last=False)
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+active_users = _ActiveUserCache()
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        ttl = settings.JWT_USER_CACHE_SECONDS
+        if ttl > 0 and not active_users.is_active(user.id, ttl):
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        return user
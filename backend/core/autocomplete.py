@@ -0,0 +1,94 @@
+"""
+In-memory prefix index for city name autocomplete.
+
+Names are normalized (diacritics stripped, case folded) and every word
+suffix of a name is indexed, so "chen" finds "Chennai" and "mum" finds
+"Navi Mumbai". Entries live in one sorted list searched with bisect, and
+the top results for every one- and two-character prefix are precomputed;
+longer prefixes are scanned once and then served from a bounded LRU.
+Cities are ranked by how many routes start or end there.
+
+The index is rebuilt when the reference cache's city table is reloaded
+(any City save or delete), and popularity is refreshed every
+REFERENCE_CACHE_SECONDS.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Route
+from .reference_cache import reference_cache
+
+MAX_RESULTS = 20
+PRECOMPUTED_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().strip()
+
+
+def route_popularity():
+    """Return ``{city_id: routes starting or ending there}`` from two grouped queries."""
+    popularity = {}
+    for column in ('source_id', 'destination_id'):
+        for city_id, count in Route.objects.values_list(column).annotate(count=Count('id')).order_by():
+            popularity[city_id] = popularity.get(city_id, 0) + count
+    return popularity
+
+
+class CityIndex:
+    def __init__(self, cities, popularity):
+        self.cities = {city['id']: city for city in cities}
+        self.rank = {city['id']: (-popularity.get(city['id'], 0), city['name'], city['id']) for city in cities}
+        entries = []
+        for city in cities:
+            words = normalize(city['name']).split()
+            entries.extend((' '.join(words[n:]), city['id']) for n in range(len(words)))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = [city_id for _, city_id in entries]
+        self.top = {}
+        self.cached_scan = lru_cache(maxsize=4096)(self._scan)
+        for prefix in {key[:length] for key in self.keys for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1)}:
+            self.top[prefix] = self._scan(prefix)
+
+    def _scan(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return heapq.nsmallest(MAX_RESULTS, set(self.ids[start:end]), key=self.rank.__getitem__)
+
+    def search(self, query, limit=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            ids = self.top.get(prefix, [])
+        else:
+            ids = self.cached_scan(prefix)
+        return [self.cities[city_id] for city_id in ids[:limit]]
+
+
+_lock = threading.Lock()
+_state = {'table': None, 'built_at': 0.0, 'index': None}
+
+
+def _needs_rebuild(table):
+    return _state['table'] is not table or time.monotonic() - _state['built_at'] >= settings.REFERENCE_CACHE_SECONDS
+
+
+def city_index():
+    """Return the current index, rebuilding it when cities changed or popularity is stale."""
+    table = reference_cache.table('city')
+    if _needs_rebuild(table):
+        with _lock:
+            if _needs_rebuild(table):
+                _state['index'] = CityIndex(list(table.values()), route_popularity())
+                _state['table'], _state['built_at'] = table, time.monotonic()
+    return _state['index']
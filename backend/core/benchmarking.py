@@ -0,0 +1,100 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Samples are recorded per endpoint label and summarized as latency
+percentiles, throughput and queries per request. Summaries are plain dicts so
+they can be written to JSON and compared against a stored baseline.
+"""
+import json
+import math
+import time
+from collections import defaultdict
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    """Collects (latency, query count, ok) samples per endpoint label."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def record(self, label, seconds, queries=None, ok=True):
+        self.latencies[label].append(seconds)
+        if queries is not None:
+            self.queries[label].append(queries)
+        if not ok:
+            self.errors[label] += 1
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            queries = self.queries.get(label)
+            endpoints[label] = {
+                'requests': len(samples),
+                'errors': self.errors[label],
+                'p50_ms': round(percentile(samples, 50) * 1000, 3),
+                'p95_ms': round(percentile(samples, 95) * 1000, 3),
+                'p99_ms': round(percentile(samples, 99) * 1000, 3),
+                'throughput_rps': round(len(samples) / sum(samples), 1) if sum(samples) else 0.0,
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            'wall_seconds': round(wall, 3),
+            'requests': total,
+            'throughput_rps': round(total / wall, 1) if wall else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+def compare_to_baseline(summary, baseline, tolerance, min_delta_ms=1.0):
+    """
+    Return human-readable regressions of ``summary`` against ``baseline``.
+
+    An endpoint regresses when its p95 latency grows by more than
+    ``tolerance`` (a fraction) and by at least ``min_delta_ms``, so sub-
+    millisecond jitter on fast endpoints does not fail a run, or when it
+    issues more queries per request. Endpoints missing from either side are
+    ignored.
+    """
+    regressions = []
+    for label, current in summary['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(label)
+        if not previous:
+            continue
+        limit = max(previous['p95_ms'] * (1 + tolerance), previous['p95_ms'] + min_delta_ms)
+        if current['p95_ms'] > limit:
+            regressions.append(
+                f"{label}: p95 {current['p95_ms']:.2f}ms exceeds baseline {previous['p95_ms']:.2f}ms "
+                f"+{tolerance:.0%}"
+            )
+        if (current['queries_per_request'] is not None and previous.get('queries_per_request') is not None
+                and current['queries_per_request'] > previous['queries_per_request'] + 0.5):
+            regressions.append(
+                f"{label}: {current['queries_per_request']} queries/request, "
+                f"baseline {previous['queries_per_request']}"
+            )
+    return regressions
+
+
+def load_json(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_json(path, data):
+    with open(path, 'w') as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+        handle.write('\n')
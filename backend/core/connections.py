@@ -0,0 +1,249 @@
+"""
+Connecting journey search over an in-memory graph of departures.
+
+A DepartureGraph holds every route departing in a two-day window starting at
+a service date's local midnight, indexed by source city and by (source,
+destination) pair, each index sorted by departure time. Journeys are found
+with a round-based (RAPTOR-style) scan: round 0 takes the departures from
+the origin on the requested day, and each further round extends the
+surviving partial journeys by one leg that leaves at least the minimum
+layover after the previous arrival. After every round, partial journeys
+ending in the same city are pruned to the Pareto set of arrival time, fare
+and departure time. Only cities with a direct departure to the destination
+are kept as final transfer points.
+
+Graphs are cached per (date, time zone) in process memory. Route saves and
+deletes update the cached graphs in place (see signals.py), and graphs are
+rebuilt after CONNECTION_GRAPH_SECONDS to pick up writes from other
+processes and bulk loads.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import Route
+
+Departure = namedtuple('Departure', 'id source destination departure arrival fare bus_id')
+
+GRAPH_WINDOW = timedelta(days=2)
+MAX_CACHED_GRAPHS = 8
+
+
+def _to_departure(route):
+    return Departure(route.id, route.source_id, route.destination_id, route.departure_time,
+                     route.arrival_time, Decimal(str(route.fare)), route.bus_id)
+
+
+class _Timetable:
+    """Departures sorted by (departure time, id), searchable by time window."""
+
+    def __init__(self):
+        self.keys = []
+        self.departures = []
+
+    def add(self, departure):
+        key = (departure.departure, departure.id)
+        index = bisect_left(self.keys, key)
+        self.keys.insert(index, key)
+        self.departures.insert(index, departure)
+
+    def remove(self, departure):
+        index = bisect_left(self.keys, (departure.departure, departure.id))
+        if index < len(self.keys) and self.keys[index][1] == departure.id:
+            del self.keys[index]
+            del self.departures[index]
+
+    def between(self, earliest, latest):
+        start = bisect_left(self.keys, (earliest, 0))
+        end = bisect_left(self.keys, (latest, float('inf')), start)
+        return self.departures[start:end]
+
+
+_EMPTY = _Timetable()
+
+
+class DepartureGraph:
+    def __init__(self, start, departures=()):
+        self.start = start
+        self.end = start + GRAPH_WINDOW
+        self.by_id = {}
+        self.from_city = defaultdict(_Timetable)
+        self.pairs = defaultdict(_Timetable)
+        self.sources_into = defaultdict(set)
+        rows = sorted(departures, key=lambda departure: (departure.departure, departure.id))
+        for departure in rows:
+            # Rows arrive sorted, so appending keeps every timetable ordered
+            self.by_id[departure.id] = departure
+            self.sources_into[departure.destination].add(departure.source)
+            for table in (self.from_city[departure.source], self.pairs[departure.source, departure.destination]):
+                table.keys.append((departure.departure, departure.id))
+                table.departures.append(departure)
+
+    @classmethod
+    def build(cls, start):
+        rows = Route.objects.filter(departure_time__gte=start, departure_time__lt=start + GRAPH_WINDOW).values_list(
+            'id', 'source_id', 'destination_id', 'departure_time', 'arrival_time', 'fare', 'bus_id'
+        )
+        return cls(start, (Departure(*row) for row in rows.iterator(chunk_size=10_000)))
+
+    def covers(self, moment):
+        return self.start <= moment < self.end
+
+    def add(self, departure):
+        self.remove(departure.id)
+        if not self.covers(departure.departure):
+            return
+        self.by_id[departure.id] = departure
+        self.from_city[departure.source].add(departure)
+        self.pairs[departure.source, departure.destination].add(departure)
+        self.sources_into[departure.destination].add(departure.source)
+
+    def remove(self, route_id):
+        departure = self.by_id.pop(route_id, None)
+        if departure is not None:
+            self.from_city[departure.source].remove(departure)
+            pair = (departure.source, departure.destination)
+            self.pairs[pair].remove(departure)
+            if not self.pairs[pair].keys:
+                del self.pairs[pair]
+                self.sources_into[departure.destination].discard(departure.source)
+
+    @staticmethod
+    def _can_continue(departure, legs_left, last_departures, min_layover):
+        # The last transfer point must have a direct departure to the
+        # destination that is still reachable after the layover
+        if legs_left > 1:
+            return True
+        last = last_departures.get(departure.destination)
+        return last is not None and departure.arrival + min_layover <= last
+
+    def search(self, origin, destination, earliest, latest, min_layover, max_layover, max_transfers=2):
+        """
+        Return every Pareto-optimal journey from origin to destination whose
+        first leg departs in [earliest, latest), as tuples of Departures.
+        """
+        last_departures = {
+            city: self.pairs[city, destination].keys[-1][0] for city in self.sources_into.get(destination, ())
+        }
+        journeys = []
+        partial = []
+        for departure in self.from_city.get(origin, _EMPTY).between(earliest, latest):
+            label = _Label(departure.arrival, departure.fare, departure.departure, (departure,))
+            if departure.destination == destination:
+                journeys.append(label)
+            elif max_transfers and self._can_continue(departure, max_transfers, last_departures, min_layover):
+                partial.append(label)
+
+        for transfers in range(1, max_transfers + 1):
+            final_round = transfers == max_transfers
+            extended = []
+            for label in _pareto_by_city(partial):
+                stop = label.legs[-1]
+                ready, give_up = stop.arrival + min_layover, stop.arrival + max_layover
+                journeys.extend(
+                    label.extend(departure)
+                    for departure in self.pairs.get((stop.destination, destination), _EMPTY).between(ready, give_up)
+                )
+                if final_round:
+                    continue
+                visited = {origin, destination}.union(leg.destination for leg in label.legs)
+                for departure in self.from_city.get(stop.destination, _EMPTY).between(ready, give_up):
+                    if departure.destination not in visited and self._can_continue(
+                            departure, max_transfers - transfers, last_departures, min_layover):
+                        extended.append(label.extend(departure))
+            partial = extended
+        return [label.legs for label in _pareto(journeys, count_transfers=True)]
+
+
+class _Label(namedtuple('_Label', 'arrival fare departure legs')):
+    """A (partial) journey with its arrival, total fare and first departure precomputed."""
+
+    def extend(self, departure):
+        return _Label(departure.arrival, self.fare + departure.fare, self.departure, self.legs + (departure,))
+
+
+def _pareto(labels, count_transfers=False):
+    """
+    Drop every journey that another arrives no later than, costs no more,
+    leaves no earlier and (optionally) changes buses no more often.
+    """
+    # Sorting by arrival first means a dominating journey is always seen first
+    labels = sorted(labels, key=lambda label: (
+        label.arrival, label.fare, len(label.legs), -label.departure.timestamp()
+    ))
+    kept = []
+    for label in labels:
+        for other in kept:
+            if (other.fare <= label.fare and other.departure >= label.departure
+                    and (not count_transfers or len(other.legs) <= len(label.legs))):
+                break
+        else:
+            kept.append(label)
+    return kept
+
+
+def _pareto_by_city(labels):
+    by_city = defaultdict(list)
+    for label in labels:
+        by_city[label.legs[-1].destination].append(label)
+    return [label for group in by_city.values() for label in _pareto(group)]
+
+
+def journey_fare(legs):
+    return sum(leg.fare for leg in legs)
+
+
+RANKINGS = {
+    'arrival': lambda legs: (legs[-1].arrival, journey_fare(legs), len(legs)),
+    'fare': lambda legs: (journey_fare(legs), legs[-1].arrival, len(legs)),
+    'transfers': lambda legs: (len(legs), legs[-1].arrival, journey_fare(legs)),
+}
+
+_lock = threading.Lock()
+_graphs = OrderedDict()  # (date, tz key) -> (built_at, graph)
+
+
+def graph_for(date, tz):
+    """Return the cached departure graph for a local service date, building it if needed."""
+    key = (date, str(tz))
+    entry = _graphs.get(key)
+    if entry is None or time.monotonic() - entry[0] >= settings.CONNECTION_GRAPH_SECONDS:
+        with _lock:
+            entry = _graphs.get(key)
+            if entry is None or time.monotonic() - entry[0] >= settings.CONNECTION_GRAPH_SECONDS:
+                entry = (time.monotonic(), DepartureGraph.build(datetime.combine(date, dt_time.min, tzinfo=tz)))
+                _graphs[key] = entry
+                while len(_graphs) > MAX_CACHED_GRAPHS:
+                    _graphs.popitem(last=False)
+    return entry[1]
+
+
+def route_saved(route):
+    departure = _to_departure(route)
+    with _lock:
+        for _, graph in _graphs.values():
+            graph.add(departure)
+
+
+def route_deleted(route_id):
+    with _lock:
+        for _, graph in _graphs.values():
+            graph.remove(route_id)
+
+
+def clear_graphs():
+    with _lock:
+        _graphs.clear()
+
+
+def find_connections(source, destination, date, tz, min_layover, max_layover=None, max_transfers=2):
+    start = datetime.combine(date, dt_time.min, tzinfo=tz)
+    max_layover = max_layover or timedelta(minutes=settings.CONNECTION_MAX_LAYOVER_MINUTES)
+    return graph_for(date, tz).search(
+        source, destination, start, start + timedelta(days=1), min_layover, max_layover, max_transfers
+    )
@@ -0,0 +1,15 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class SeatUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Some seats are no longer available.'
+    default_code = 'seat_unavailable'
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ups in progress, please retry shortly.'
+    default_code = 'hashing_busy'
+    wait = 1  # sent as Retry-After by DRF's exception handler
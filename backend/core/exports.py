@@ -0,0 +1,116 @@
+"""
+Streaming booking exports (passenger manifests and daily booking dumps).
+
+Rows are one per passenger, with the booking, trip and seat alongside. The
+bookings are read with ``.iterator(chunk_size=...)`` and, for every chunk,
+their passengers and seats are fetched with one query each, so memory stays
+bounded by the chunk size however many bookings are exported. A booking's
+passengers are paired with its seats in the order both were submitted.
+
+The encoders yield one line at a time, ready for StreamingHttpResponse or
+for writing to a file.
+"""
+import csv
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice, zip_longest
+
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Booking, Passenger
+from .reference_cache import reference_cache
+
+COLUMNS = [
+    'booking_id', 'booked_at', 'status', 'user', 'route_id', 'source', 'destination', 'departure_time',
+    'total_fare', 'seat_number', 'passenger_name', 'age', 'gender',
+]
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+_BOOKING_COLUMNS = (
+    'id', 'booking_date', 'status', 'user__username', 'route_id', 'route__source_id', 'route__destination_id',
+    'route__departure_time', 'total_fare',
+)
+
+
+def bookings_on(date, tz=None):
+    """Bookings made on a local calendar date."""
+    start = datetime.combine(date, time.min, tzinfo=tz or timezone.get_current_timezone())
+    return Booking.objects.filter(booking_date__gte=start, booking_date__lt=start + timedelta(days=1))
+
+
+def _grouped(rows):
+    groups = defaultdict(list)
+    for booking_id, value in rows:
+        groups[booking_id].append(value)
+    return groups
+
+
+def _city_name(city_id):
+    city = reference_cache.city(city_id)
+    return city['name'] if city else None
+
+
+def export_rows(bookings, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one dict per passenger and seat of ``bookings``, ordered by booking id."""
+    rows = bookings.order_by('id').values_list(*_BOOKING_COLUMNS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        booking_ids = [row[0] for row in chunk]
+        passengers = _grouped(
+            (booking_id, passenger) for booking_id, *passenger in
+            Passenger.objects.filter(booking_id__in=booking_ids).order_by('booking_id', 'id')
+            .values_list('booking_id', 'name', 'age', 'gender')
+        )
+        seats = _grouped(
+            Booking.seats.through.objects.filter(booking_id__in=booking_ids).order_by('booking_id', 'id')
+            .values_list('booking_id', 'seat__seat_number')
+        )
+        for booking_id, booked_at, status, user, route_id, source_id, destination_id, departure, fare in chunk:
+            booking = {
+                'booking_id': booking_id,
+                'booked_at': booked_at,
+                'status': status,
+                'user': user,
+                'route_id': route_id,
+                'source': _city_name(source_id),
+                'destination': _city_name(destination_id),
+                'departure_time': departure,
+                'total_fare': fare,
+            }
+            pairs = zip_longest(seats.get(booking_id, ()), passengers.get(booking_id, ()), fillvalue=None)
+            for seat_number, passenger in pairs:
+                name, age, gender = passenger or (None, None, None)
+                yield dict(booking, seat_number=seat_number, passenger_name=name, age=age, gender=gender)
+
+
+class _Line:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def as_csv(rows):
+    writer = csv.writer(_Line())
+    encoder = JSONEncoder()
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        # Datetimes are written the way the JSON API writes them
+        yield writer.writerow([
+            encoder.default(value) if isinstance(value, datetime) else value for value in map(row.get, COLUMNS)
+        ])
+
+
+def as_ndjson(rows):
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def encode(rows, fmt):
+    """Encode export rows as lines of ``fmt`` ('csv' or 'ndjson')."""
+    return as_csv(rows) if fmt == 'csv' else as_ndjson(rows)
@@ -0,0 +1,106 @@
+"""
+Precomputed fare calendar: one FareCalendarDay row per (source, destination,
+local service date) with the cheapest fare, number of departures and free
+seats.
+
+Rows are computed with one grouped aggregate over Route and kept current
+incrementally: route saves and deletes recompute the affected days (see
+signals.py), and bookings and cancellations shift ``seats_left`` with F()
+updates inside their own transactions. ``rebuild_fare_calendar`` (and the
+command of the same name) recomputes everything.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Route, FareCalendarDay
+
+FIELDS = ['min_fare', 'departures', 'seats_left']
+
+
+def service_date(moment):
+    return timezone.localdate(moment)
+
+
+def calendar_key(route):
+    return (route.source_id, route.destination_id, service_date(route.departure_time))
+
+
+def aggregate_days(routes):
+    """Group ``routes`` by city pair and local departure date in one aggregate query."""
+    return (
+        routes.annotate(date=TruncDate('departure_time'))
+        .values('source_id', 'destination_id', 'date')
+        .annotate(
+            min_fare=Min('fare'),
+            departures=Count('id'),
+            seats_left=Sum(F('seat_count') - F('booked_count')),
+        )
+        .order_by()
+    )
+
+
+def _day_filter(source_id, destination_id, date):
+    start = datetime.combine(date, time.min, tzinfo=timezone.get_current_timezone())
+    return Q(source_id=source_id, destination_id=destination_id,
+             departure_time__gte=start, departure_time__lt=start + timedelta(days=1))
+
+
+def refresh_days(keys):
+    """Recompute the calendar rows for a set of (source_id, destination_id, date) keys."""
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+    routes = Q()
+    for key in keys:
+        routes |= _day_filter(*key)
+    rows = [FareCalendarDay(**row) for row in aggregate_days(Route.objects.filter(routes))]
+    with transaction.atomic():
+        FareCalendarDay.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['source', 'destination', 'date'], update_fields=FIELDS,
+        )
+        empty = keys - {(row.source_id, row.destination_id, row.date) for row in rows}
+        if empty:
+            stale = Q()
+            for source_id, destination_id, date in empty:
+                stale |= Q(source_id=source_id, destination_id=destination_id, date=date)
+            FareCalendarDay.objects.filter(stale).delete()
+
+
+def refresh_routes(route_ids):
+    """Recompute the calendar days of the given routes."""
+    keys = {
+        (source_id, destination_id, service_date(departure))
+        for source_id, destination_id, departure in
+        Route.objects.filter(id__in=route_ids).values_list('source_id', 'destination_id', 'departure_time')
+    }
+    refresh_days(keys)
+
+
+def adjust_seats(route, delta):
+    """Shift the free-seat count of the route's day by ``delta`` without recomputing it."""
+    if delta:
+        source_id, destination_id, date = calendar_key(route)
+        FareCalendarDay.objects.filter(source_id=source_id, destination_id=destination_id, date=date).update(
+            seats_left=F('seats_left') + delta
+        )
+
+
+def rebuild_fare_calendar(batch_size=5000):
+    """Recompute the whole calendar. Returns the number of rows written."""
+    written = 0
+    with transaction.atomic():
+        FareCalendarDay.objects.all().delete()
+        batch = []
+        for row in aggregate_days(Route.objects.all()).iterator(chunk_size=batch_size):
+            batch.append(FareCalendarDay(**row))
+            if len(batch) >= batch_size:
+                FareCalendarDay.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        FareCalendarDay.objects.bulk_create(batch)
+        written += len(batch)
+    return written
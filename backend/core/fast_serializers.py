@@ -0,0 +1,127 @@
+"""
+Read-only serialization straight from ``.values()`` rows.
+
+The hot list endpoints (route list and search, buses, seats) render up to a
+page of rows per request, and through ModelSerializer most of that time goes
+into field introspection and building model instances. A ValuesSerializer
+declares its output once as ``name -> Column``, reads only those columns
+with ``.values()`` and builds every dict with converters bound once per
+call. Output matches the ModelSerializer it shadows key for key and value
+for value (see FastSerializerParityTests); writes and single-object reads
+still go through the DRF serializers.
+"""
+import decimal
+
+from django.utils import timezone
+
+from .instrumentation import serializer_timer
+from .reference_cache import reference_cache
+
+
+class Column:
+    """A model column copied as-is. ``column`` defaults to the output name."""
+
+    def __init__(self, column=None):
+        self.column = column
+
+    def bind(self):
+        return None
+
+
+class DateTimeColumn(Column):
+    """ISO 8601 in the current time zone, with a UTC offset written as Z (DRF's DateTimeField)."""
+
+    def bind(self):
+        tz = timezone.get_current_timezone()
+
+        def convert(value):
+            if not value:
+                return None
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+
+class DecimalColumn(Column):
+    """A string quantized to ``decimal_places`` (DRF's DecimalField with coerce_to_string)."""
+
+    def __init__(self, max_digits, decimal_places, column=None):
+        super().__init__(column)
+        self.quantum = decimal.Decimal('.1') ** decimal_places
+        self.max_digits = max_digits
+
+    def bind(self):
+        context = decimal.getcontext().copy()
+        context.prec = self.max_digits
+        quantum = self.quantum
+
+        def convert(value):
+            if value is None:
+                return ''
+            return '{:f}'.format(value.quantize(quantum, context=context))
+        return convert
+
+
+class ReferenceColumn(Column):
+    """A foreign key rendered from the reference cache, like serializers.ReferenceField."""
+
+    def __init__(self, kind, column):
+        super().__init__(column)
+        self.kind = kind
+
+    def bind(self):
+        return getattr(reference_cache, self.kind)
+
+
+class ValuesSerializer:
+    fields = {}  # output name -> Column, in output order
+
+    def __init__(self):
+        self.columns = [spec.column or name for name, spec in self.fields.items()]
+
+    def values(self, queryset):
+        """``queryset`` narrowed to the columns this serializer reads, as dicts."""
+        return queryset.values(*self.columns)
+
+    def serialize(self, rows):
+        bound = [(name, column, spec.bind()) for (name, spec), column in zip(self.fields.items(), self.columns)]
+        with serializer_timer():
+            return [
+                {name: row[column] if convert is None else convert(row[column]) for name, column, convert in bound}
+                for row in rows
+            ]
+
+
+class RouteValuesSerializer(ValuesSerializer):
+    fields = {
+        'id': Column(),
+        'source': ReferenceColumn('city', 'source_id'),
+        'destination': ReferenceColumn('city', 'destination_id'),
+        'bus': ReferenceColumn('bus', 'bus_id'),
+        'departure_time': DateTimeColumn(),
+        'arrival_time': DateTimeColumn(),
+        'fare': DecimalColumn(10, 2),
+    }
+
+
+class RouteSearchValuesSerializer(ValuesSerializer):
+    fields = dict(RouteValuesSerializer.fields, available_seats=Column(), booked_seats=Column())
+
+
+class BusValuesSerializer(ValuesSerializer):
+    fields = {
+        'id': Column(),
+        'operator': ReferenceColumn('operator', 'operator_id'),
+        'bus_number': Column(),
+        'bus_type': Column(),
+        'total_seats': Column(),
+        'rating': Column(),
+    }
+
+
+class SeatValuesSerializer(ValuesSerializer):
+    fields = {
+        'id': Column(),
+        'bus': Column('bus_id'),
+        'seat_number': Column(),
+    }
@@ -0,0 +1,75 @@
+"""
+Password hashing off the request thread, with a bounded backlog.
+
+Every registration pays for one PBKDF2 hash, which is pure CPU. Hashes run
+on a small per-process thread pool (PASSWORD_HASH_WORKERS threads, with at
+most PASSWORD_HASH_QUEUE more waiting), so a sign-up surge cannot take more
+than that share of a worker's CPU. A request that finds the pool and its
+queue full fails fast with HashingBusy (503 with Retry-After) instead of
+piling up behind the others. hashlib releases the GIL while hashing, so the
+pool threads run alongside request threads.
+
+PASSWORD_HASH_ITERATIONS sets the PBKDF2 cost (0 keeps Django's default).
+Existing hashes made with another cost still verify and are upgraded the
+next time their user logs in.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+
+from .exceptions import HashingBusy
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """Django's pbkdf2_sha256 with the iteration count taken from PASSWORD_HASH_ITERATIONS."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class HashingPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                workers = settings.PASSWORD_HASH_WORKERS
+                self._slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASH_QUEUE)
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def run(self, func, *args):
+        """Call ``func(*args)`` on the pool and wait for it; raise HashingBusy if no slot is free."""
+        if self._executor is None:
+            self._start()
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def map(self, func, iterable):
+        """``map`` across the pool threads without the backlog limit, for management commands."""
+        if self._executor is None:
+            self._start()
+        return self._executor.map(func, iterable)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = self._slots = None
+
+
+hashing_pool = HashingPool()
+
+
+def hash_password(raw_password):
+    """The encoded hash of ``raw_password``, computed on the hashing pool."""
+    return hashing_pool.run(make_password, raw_password)
@@ -0,0 +1,126 @@
+"""
+Per-request performance counters.
+
+PerformanceMiddleware opens a RequestMetrics for every request and keeps it
+in a context variable. QueryTimer (installed with connection.execute_wrapper)
+adds database time to it, TimedSerializerMixin adds serializer time, and the
+finished request is folded into a process-local registry that the metrics
+endpoint renders in the Prometheus text format.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+# Upper bound on the statements kept for a slow-request dump
+MAX_CAPTURED_QUERIES = 200
+
+
+class RequestMetrics:
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.capture_sql = capture_sql
+        self.sql = []
+        self._serializer_depth = 0
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def track_request(capture_sql=False):
+    metrics = RequestMetrics(capture_sql)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+class QueryTimer:
+    """``connection.execute_wrapper`` hook that times every query of the current request."""
+
+    def __call__(self, execute, sql, params, many, context):
+        metrics = _current.get()
+        if metrics is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.queries += 1
+            metrics.db_seconds += elapsed
+            if metrics.capture_sql and len(metrics.sql) < MAX_CAPTURED_QUERIES:
+                metrics.sql.append({'sql': sql, 'ms': round(elapsed * 1000, 3)})
+
+
+@contextmanager
+def serializer_timer():
+    """Time serialization; nested serializers are counted once, by the outermost one."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics._serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._serializer_depth -= 1
+        if not metrics._serializer_depth:
+            metrics.serializer_seconds += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+class MetricsRegistry:
+    """Request counters per (view, method, status), kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)
+        self.totals = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, view, method, status, duration, metrics, response_bytes):
+        with self._lock:
+            self.requests[(view, method, status)] += 1
+            totals = self.totals[view]
+            totals['seconds'] += duration
+            totals['db_seconds'] += metrics.db_seconds
+            totals['serializer_seconds'] += metrics.serializer_seconds
+            totals['queries'] += metrics.queries
+            totals['response_bytes'] += response_bytes
+
+    def render(self, extra=()):
+        """Return the counters in the Prometheus text exposition format."""
+        lines = ['# TYPE busticket_requests_total counter']
+        with self._lock:
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'busticket_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}'
+                )
+            for name in ('seconds', 'db_seconds', 'serializer_seconds', 'queries', 'response_bytes'):
+                lines.append(f'# TYPE busticket_request_{name}_total counter')
+                for view, totals in sorted(self.totals.items()):
+                    lines.append(f'busticket_request_{name}_total{{view="{view}"}} {totals[name]:g}')
+        for name, value in extra:
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,280 @@
+"""
+Per-trip seat inventory helpers.
+
+Every (route, seat) pair owns one RouteSeat row, so booking a seat on one
+departure never affects other departures of the same bus. All helpers touch
+only the rows of a single trip.
+
+Each Route also carries denormalized counters (seat_count, booked_count and
+revenue) so availability is read from the route row instead of counting its
+inventory. Single bookings and cancellations shift them with F() updates in
+their own transaction; set-based operations recompute them with
+refresh_route_counters, and the fix_route_counters command repairs drift
+(including from deleting seats or bookings, which is not tracked).
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Route, Seat, RouteSeat, Booking
+from .fare_calendar import refresh_days, service_date
+
+
+def ensure_route_inventory(route):
+    """
+    Match the route's inventory to its bus: drop unbooked rows of seats on
+    another bus (left by a bus change) and create the missing ones.
+    """
+    RouteSeat.objects.filter(route_id=route.id, is_booked=False).exclude(seat__bus_id=route.bus_id).delete()
+    seat_ids = Seat.objects.filter(bus_id=route.bus_id).values_list('id', flat=True)
+    RouteSeat.objects.bulk_create(
+        [RouteSeat(route_id=route.id, seat_id=seat_id) for seat_id in seat_ids],
+        ignore_conflicts=True,
+    )
+    refresh_route_counters(Route.objects.filter(id=route.id))
+
+
+def add_seat_to_routes(seat):
+    """Add a newly created seat to the inventory of every route of its bus."""
+    route_ids = Route.objects.filter(bus_id=seat.bus_id).values_list('id', flat=True)
+    RouteSeat.objects.bulk_create(
+        [RouteSeat(route_id=route_id, seat_id=seat.id) for route_id in route_ids],
+        ignore_conflicts=True,
+    )
+    refresh_route_counters(Route.objects.filter(bus_id=seat.bus_id))
+
+
+def _count(queryset, aggregate):
+    """Correlated per-route aggregate over ``queryset`` (filtered on ``route_id``), 0 when empty."""
+    rows = queryset.filter(route_id=OuterRef('id')).order_by().values('route_id').annotate(total=aggregate)
+    return Coalesce(Subquery(rows.values('total')), Value(0), output_field=aggregate.output_field)
+
+
+def counter_expressions():
+    """The values Route's denormalized counters should hold, computed from inventory and bookings."""
+    return {
+        'seat_count': _count(RouteSeat.objects.all(), Count('id')),
+        'booked_count': _count(RouteSeat.objects.filter(is_booked=True), Count('id')),
+        'revenue': _count(
+            Booking.objects.exclude(status='Cancelled'),
+            Sum('total_fare', output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ),
+    }
+
+
+def refresh_route_counters(routes):
+    """Recompute the counters of every route in the ``routes`` queryset with one UPDATE."""
+    return routes.update(**counter_expressions())
+
+
+def adjust_route_counters(route_id, booked, revenue):
+    """Shift a route's counters by a booking or cancellation; call inside its transaction."""
+    Route.objects.filter(id=route_id).update(booked_count=F('booked_count') + booked, revenue=F('revenue') + revenue)
+
+
+def counter_drift(routes):
+    """Routes in ``routes`` whose stored counters disagree with their inventory and bookings."""
+    actual = {f'actual_{name}': expression for name, expression in counter_expressions().items()}
+    drifted = Q()
+    for name in ('seat_count', 'booked_count', 'revenue'):
+        drifted |= ~Q(**{name: F(f'actual_{name}')})
+    return routes.annotate(**actual).filter(drifted)
+
+
+def repair_route_counters(routes, batch_size=5000, dry_run=False):
+    """
+    Find and repair the routes in ``routes`` whose counters drifted, one
+    window of ``batch_size`` route ids at a time, each repaired with its own
+    UPDATE. Yields the drifted route ids of every window.
+    """
+    bounds = routes.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        window = routes.filter(id__gte=start, id__lt=start + batch_size)
+        route_ids = list(counter_drift(window).values_list('id', flat=True))
+        if route_ids and not dry_run:
+            refresh_route_counters(Route.objects.filter(id__in=route_ids))
+        yield route_ids
+
+
+def rebuild_route_counters(batch_size=5000, dry_run=False):
+    """Repair every route whose counters drifted. Returns the number of drifted routes."""
+    return sum(len(route_ids) for route_ids in repair_route_counters(Route.objects.all(), batch_size, dry_run))
+
+
+def unheld(now=None, prefix=''):
+    """Filter matching inventory rows (reached through ``prefix``) that carry no live hold."""
+    now = now or timezone.now()
+    return Q(**{f'{prefix}held_until__isnull': True}) | Q(**{f'{prefix}held_until__lt': now})
+
+
+def availability_annotations(now=None):
+    """
+    Free and booked seat expressions for a Route queryset, read from the
+    route's counters. Seats under a live hold are neither available nor
+    booked; only those are counted from the inventory, through the
+    held_until index.
+    """
+    now = now or timezone.now()
+    held = _count(RouteSeat.objects.filter(is_booked=False, held_until__gte=now), Count('id'))
+    return {
+        'available_seats': F('seat_count') - F('booked_count') - held,
+        'booked_seats': F('booked_count'),
+    }
+
+
+def _availability_rows(route_ids):
+    return Route.objects.filter(id__in=route_ids).values('id').annotate(**availability_annotations())
+
+
+def route_availability(route_ids):
+    """Return ``{route_id: {'available_seats': n, 'booked_seats': m}}`` in one query over the routes."""
+    return {row.pop('id'): row for row in _availability_rows(route_ids)}
+
+
+async def aroute_availability(route_ids):
+    """Async version of route_availability."""
+    return {row.pop('id'): row async for row in _availability_rows(route_ids)}
+
+
+def unavailable_seat_ids(route_id, seat_ids, hold_token=None):
+    """
+    Return the subset of seat_ids that cannot be booked on the given route:
+    already booked, or under a live hold that is not ``hold_token``.
+    """
+    claimable = unheld()
+    if hold_token:
+        claimable |= Q(hold_token=hold_token)
+    return set(
+        RouteSeat.objects.filter(route_id=route_id, seat_id__in=seat_ids)
+        .filter(Q(is_booked=True) | ~claimable)
+        .values_list('seat_id', flat=True)
+    )
+
+
+def hold_seats(route_id, seat_ids, minutes=None):
+    """
+    Reserve free, unheld seats of a route for a limited time.
+
+    Returns ``(hold_token, held_until)``, or ``None`` when any seat is booked or
+    held by someone else, in which case nothing is reserved.
+    """
+    minutes = minutes or settings.SEAT_HOLD_MINUTES
+    now = timezone.now()
+    hold_token = uuid.uuid4()
+    held_until = now + timedelta(minutes=minutes)
+    with transaction.atomic():
+        held = RouteSeat.objects.filter(
+            unheld(now), route_id=route_id, seat_id__in=seat_ids, is_booked=False
+        ).update(hold_token=hold_token, held_until=held_until)
+        if held != len(seat_ids):
+            transaction.set_rollback(True)
+            return None
+    return hold_token, held_until
+
+
+def release_hold(hold_token):
+    """Drop a hold before it expires. Returns the number of seats released."""
+    return RouteSeat.objects.filter(hold_token=hold_token).update(hold_token=None, held_until=None)
+
+
+def expire_holds(now=None):
+    """Clear every hold whose expiry has passed in one indexed bulk UPDATE."""
+    now = now or timezone.now()
+    return RouteSeat.objects.filter(held_until__lt=now).update(hold_token=None, held_until=None)
+
+
+def claim_seats(route_id, seat_ids, booking, hold_token=None):
+    """
+    Atomically mark free seats of a route as booked by the booking.
+
+    Issues a single ``UPDATE ... WHERE seat_id IN (...) AND is_booked = false``
+    and returns the affected row count; anything less than ``len(seat_ids)``
+    means another booking won the race for at least one seat. Seats held by
+    someone else are skipped unless ``hold_token`` matches, and a consumed
+    hold is cleared in the same statement.
+    """
+    claimable = unheld()
+    if hold_token:
+        claimable |= Q(hold_token=hold_token)
+    return RouteSeat.objects.filter(
+        claimable, route_id=route_id, seat_id__in=seat_ids, is_booked=False
+    ).update(is_booked=True, booking=booking, hold_token=None, held_until=None)
+
+
+def release_booking_seats(booking):
+    """Free every seat held by the booking on its route. Returns the row count."""
+    return RouteSeat.objects.filter(booking=booking).update(is_booked=False, booking=None)
+
+
+def cancel_bookings(bookings):
+    """
+    Cancel every confirmed booking in the ``bookings`` queryset and free its
+    seats with two set-based UPDATEs. Returns the ids that were cancelled;
+    call inside a transaction.
+    """
+    confirmed = bookings.filter(status='Confirmed').values_list(
+        'id', 'route_id', 'route__source_id', 'route__destination_id', 'route__departure_time'
+    )
+    booking_ids, route_ids, days = [], set(), set()
+    for booking_id, route_id, source_id, destination_id, departure in confirmed:
+        booking_ids.append(booking_id)
+        route_ids.add(route_id)
+        days.add((source_id, destination_id, service_date(departure)))
+    if booking_ids:
+        Booking.objects.filter(id__in=booking_ids, status='Confirmed').update(status='Cancelled')
+        RouteSeat.objects.filter(booking_id__in=booking_ids).update(is_booked=False, booking=None)
+        refresh_route_counters(Route.objects.filter(id__in=route_ids))
+        refresh_days(days)
+    return booking_ids
+
+
+def _active_links():
+    """Booking.seats through rows of non-cancelled bookings, correlated to an outer RouteSeat."""
+    return Booking.seats.through.objects.filter(
+        booking__route_id=OuterRef('route_id'), seat_id=OuterRef('seat_id'),
+    ).exclude(booking__status='Cancelled')
+
+
+def reconcile_inventory(route_id=None, bus_id=None, batch_size=5000, dry_run=False):
+    """
+    Make RouteSeat.is_booked agree with the Booking.seats links of
+    non-cancelled bookings, using set-based SQL.
+
+    Two diffs are computed against the through table: seats flagged as booked
+    with no active booking behind them (freed), and seats of an active booking
+    still flagged as free (claimed for that booking). Each is fixed with one
+    bulk UPDATE per window of ``batch_size`` inventory ids, and every UPDATE
+    commits on its own so the table is never locked for the whole run.
+
+    Returns ``{'freed': n, 'claimed': m}``; with ``dry_run`` nothing is written
+    and the counts are what would change.
+    """
+    scope = RouteSeat.objects.all()
+    if route_id is not None:
+        scope = scope.filter(route_id=route_id)
+    if bus_id is not None:
+        scope = scope.filter(route__bus_id=bus_id)
+
+    stale = Q(is_booked=True) & ~Exists(_active_links())
+    missing = Q(is_booked=False) & Exists(_active_links())
+    if dry_run:
+        return {'freed': scope.filter(stale).count(), 'claimed': scope.filter(missing).count()}
+
+    bounds = scope.aggregate(low=Min('id'), high=Max('id'))
+    totals = {'freed': 0, 'claimed': 0}
+    if bounds['low'] is None:
+        return totals
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        window = scope.filter(id__gte=start, id__lt=start + batch_size)
+        totals['freed'] += window.filter(stale).update(is_booked=False, booking=None)
+        totals['claimed'] += window.filter(missing).update(
+            is_booked=True, booking_id=Subquery(_active_links().order_by('booking_id').values('booking_id')[:1]),
+        )
+    return totals
@@ -0,0 +1,212 @@
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from core.benchmarking import Recorder, compare_to_baseline, load_json, write_json
+from core.models import Route
+
+# action -> relative weight in the scenario mix
+SCENARIO_MIX = {
+    'search': 50,
+    'seat_map': 25,
+    'book': 15,
+    'cancel': 5,
+    'profile': 5,
+}
+
+
+class InProcessTransport:
+    """Drives busticket.urls through Django's test client and counts queries per request."""
+
+    def __init__(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def request(self, method, path, params=None, data=None, token=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        body = json.dumps(data) if data is not None else None
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if method == 'GET':
+                response = self.client.get(path, **headers)
+            else:
+                response = self.client.generic(method, path, body or '', content_type='application/json', **headers)
+            elapsed = time.perf_counter() - started
+        payload = json.loads(response.content) if response.content else None
+        return response.status_code, payload, elapsed, len(queries)
+
+
+class HttpTransport:
+    """Drives a running server (e.g. a local gunicorn) over HTTP; query counts are not available."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, params=None, data=None, token=None):
+        url = self.base_url + path + (f'?{urlencode(params)}' if params else '')
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, content = error.code, error.read()
+        elapsed = time.perf_counter() - started
+        payload = json.loads(content) if content else None
+        return status, payload, elapsed, None
+
+
+class Command(BaseCommand):
+    help = 'Run a realistic register/search/seat map/book/cancel mix against the API and report latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help='Scenario steps to run')
+        parser.add_argument('--users', type=int, default=5, help='Users registered at the start of the run')
+        parser.add_argument('--routes', type=int, default=500, help='Upcoming routes sampled for the run')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--base-url', help='Benchmark a running server instead of the in-process client')
+        parser.add_argument('--keep-data', action='store_true',
+                            help='Keep users and bookings created by an in-process run (rolled back by default)')
+        parser.add_argument('--output', default='benchmark_results.json', help='Where to write the JSON results')
+        parser.add_argument('--baseline', help='Baseline JSON to compare against; regressions fail the run')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 growth over the baseline')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help='Ignore p95 growth smaller than this many milliseconds')
+        parser.add_argument('--save-baseline', action='store_true', help='Write these results to --baseline')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.recorder = Recorder()
+        if options['base_url']:
+            self.transport = HttpTransport(options['base_url'])
+            self.run(options)
+        else:
+            self.transport = InProcessTransport()
+            with transaction.atomic():
+                self.run(options)
+                transaction.set_rollback(not options['keep_data'])
+
+        summary = self.recorder.summary()
+        summary['meta'] = {
+            'iterations': options['iterations'],
+            'seed': options['seed'],
+            'target': options['base_url'] or 'in-process',
+            'database': connection.vendor,
+        }
+        self.report(summary)
+        write_json(options['output'], summary)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            if options['save_baseline']:
+                write_json(options['baseline'], summary)
+                self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+                return
+            regressions = compare_to_baseline(
+                summary, load_json(options['baseline']), options['tolerance'], options['min_delta_ms']
+            )
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def call(self, label, method, path, params=None, data=None, token=None, expected=(200, 201)):
+        status, payload, elapsed, queries = self.transport.request(method, path, params, data, token)
+        self.recorder.record(label, elapsed, queries, ok=status in expected)
+        return status, payload
+
+    def run(self, options):
+        routes = self.sample_routes(options['routes'])
+        if not routes:
+            raise CommandError("No upcoming routes found; seed the database first (manage.py seed_bulk).")
+        users = [self.register(f'bench_{options["seed"]}_{n}_{int(time.time())}') for n in range(options['users'])]
+        self.free_seats = {}
+        self.bookings = {token: [] for token in users}
+
+        actions = list(SCENARIO_MIX)
+        weights = list(SCENARIO_MIX.values())
+        for _ in range(options['iterations']):
+            action = self.rng.choices(actions, weights)[0]
+            getattr(self, f'step_{action}')(self.rng.choice(routes), self.rng.choice(users))
+
+    def sample_routes(self, count):
+        upcoming = Route.objects.filter(departure_time__gte=timezone.now())
+        first = upcoming.order_by('id').values_list('id', flat=True).first()
+        last = upcoming.order_by('-id').values_list('id', flat=True).first()
+        if first is None:
+            return []
+        start = self.rng.randint(first, max(first, last - count))
+        return list(
+            upcoming.filter(id__gte=start).order_by('id')
+            .values('id', 'source_id', 'destination_id', 'departure_time', 'fare')[:count]
+        )
+
+    def register(self, username):
+        password = 'bench-pass-123'
+        self.call('register', 'POST', '/api/register/', data={
+            'username': username, 'email': f'{username}@bench.local', 'password': password,
+        })
+        _, payload = self.call('token', 'POST', '/api/token/', data={'username': username, 'password': password})
+        return payload['access']
+
+    def step_search(self, route, token):
+        self.call('routes-search', 'GET', '/api/routes/search/', params={
+            'source': route['source_id'],
+            'destination': route['destination_id'],
+            'date': timezone.localtime(route['departure_time']).date().isoformat(),
+        })
+
+    def step_seat_map(self, route, token):
+        status, payload = self.call('seats-available', 'GET', '/api/seats/available_seats/',
+                                    params={'route_id': route['id']})
+        if status == 200:
+            self.free_seats[route['id']] = [seat['id'] for seat in payload['results']]
+
+    def step_book(self, route, token):
+        if route['id'] not in self.free_seats:
+            self.step_seat_map(route, token)
+        free = self.free_seats.get(route['id']) or []
+        if not free:
+            return
+        seats = self.rng.sample(free, min(len(free), self.rng.choice((1, 1, 2, 3))))
+        status, payload = self.call('bookings-create', 'POST', '/api/bookings/', token=token, expected=(201, 409), data={
+            'route': route['id'],
+            'seats': seats,
+            'passengers': [{'name': 'Bench', 'age': 30, 'gender': 'Other'} for _ in seats],
+            'total_fare': str(route['fare'] * len(seats)),
+        })
+        self.free_seats[route['id']] = [seat for seat in free if seat not in seats]
+        if status == 201:
+            self.bookings[token].append(payload['id'])
+
+    def step_cancel(self, route, token):
+        if self.bookings[token]:
+            booking_id = self.bookings[token].pop(self.rng.randrange(len(self.bookings[token])))
+            self.call('bookings-cancel', 'POST', f'/api/bookings/{booking_id}/cancel/', token=token)
+
+    def step_profile(self, route, token):
+        self.call('profile', 'GET', '/api/profile/', token=token)
+
+    def report(self, summary):
+        self.stdout.write(f"{'endpoint':<18}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'p99 ms':>9}{'req/s':>9}{'queries':>9}")
+        for label, stats in summary['endpoints'].items():
+            queries = '-' if stats['queries_per_request'] is None else stats['queries_per_request']
+            self.stdout.write(
+                f"{label:<18}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.2f}"
+                f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['throughput_rps']:>9.1f}{queries:>9}"
+            )
+        self.stdout.write(f"Total: {summary['requests']} requests in {summary['wall_seconds']}s "
+                          f"({summary['throughput_rps']} req/s)")
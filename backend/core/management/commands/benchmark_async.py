@@ -0,0 +1,112 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.utils import timezone
+from core.benchmarking import Recorder, write_json
+from core.models import Route
+
+# endpoint -> (sync path, async path)
+ENDPOINTS = {
+    'routes-search': ('/api/routes/search/', '/api/async/routes/search/'),
+    'seats-available': ('/api/seats/available_seats/', '/api/async/seats/available/'),
+    'cities': ('/api/cities/', '/api/async/cities/'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput of the sync and async read endpoints on the current dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once')
+        parser.add_argument('--routes', type=int, default=200, help='Upcoming routes sampled for the run')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark_async.json', help='Where to write the JSON results')
+
+    def handle(self, *args, **options):
+        routes = list(
+            Route.objects.filter(departure_time__gte=timezone.now()).order_by('id')
+            .values('id', 'source_id', 'destination_id', 'departure_time')[:options['routes']]
+        )
+        if not routes:
+            raise CommandError("No upcoming routes found; seed the database first (manage.py seed_bulk).")
+        # Both modes replay the same request list
+        rng = random.Random(options['seed'])
+        plan = [self.make_request(rng, rng.choice(routes)) for _ in range(options['requests'])]
+
+        results = {
+            'sync': self.run_sync(plan, options['concurrency']),
+            'async': asyncio.run(self.run_async(plan, options['concurrency'])),
+        }
+        results['meta'] = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'database': connection.vendor,
+        }
+        self.report(results)
+        write_json(options['output'], results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def make_request(self, rng, route):
+        endpoint = rng.choices(list(ENDPOINTS), (60, 30, 10))[0]
+        if endpoint == 'routes-search':
+            params = {
+                'source': route['source_id'],
+                'destination': route['destination_id'],
+                'date': timezone.localtime(route['departure_time']).date().isoformat(),
+            }
+        elif endpoint == 'seats-available':
+            params = {'route_id': route['id']}
+        else:
+            params = {}
+        return endpoint, params
+
+    def run_sync(self, plan, concurrency):
+        recorder = Recorder()
+
+        def worker(requests):
+            client = Client(SERVER_NAME='localhost')
+            try:
+                for endpoint, params in requests:
+                    started = time.perf_counter()
+                    response = client.get(ENDPOINTS[endpoint][0], params)
+                    recorder.record(endpoint, time.perf_counter() - started, ok=response.status_code == 200)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(worker, [plan[n::concurrency] for n in range(concurrency)]))
+        return recorder.summary()
+
+    async def run_async(self, plan, concurrency):
+        recorder = Recorder()
+        client = AsyncClient(SERVER_NAME='localhost')
+        slots = asyncio.Semaphore(concurrency)
+
+        async def fetch(endpoint, params):
+            async with slots:
+                started = time.perf_counter()
+                response = await client.get(ENDPOINTS[endpoint][1], params)
+                recorder.record(endpoint, time.perf_counter() - started, ok=response.status_code == 200)
+
+        await asyncio.gather(*(fetch(endpoint, params) for endpoint, params in plan))
+        return recorder.summary()
+
+    def report(self, results):
+        self.stdout.write(f"{'mode':<7}{'endpoint':<18}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'p99 ms':>9}")
+        for mode in ('sync', 'async'):
+            for label, stats in results[mode]['endpoints'].items():
+                self.stdout.write(
+                    f"{mode:<7}{label:<18}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.2f}"
+                    f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+                )
+        for mode in ('sync', 'async'):
+            self.stdout.write(f"{mode}: {results[mode]['requests']} requests in {results[mode]['wall_seconds']}s "
+                              f"({results[mode]['throughput_rps']} req/s)")
@@ -0,0 +1,71 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.authentication import ClaimsJWTAuthentication, ProfileTokenObtainPairSerializer, active_users
+from core.benchmarking import Recorder, write_json
+from core.models import UserProfile
+from core.views import ProfileView
+
+# label -> (authentication class, JWT_USER_CACHE_SECONDS)
+AUTHENTICATORS = {
+    'db-lookup': (JWTAuthentication, 0),
+    'claims': (ClaimsJWTAuthentication, 0),
+    'claims-cached': (ClaimsJWTAuthentication, 60),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-request cost of JWT authentication with a user lookup and from token claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests timed per authenticator')
+        parser.add_argument('--output', default='benchmark_auth.json', help='Where to write the JSON results')
+
+    def handle(self, *args, **options):
+        self.recorder = Recorder()
+        # The benchmark user is rolled back with everything else
+        with transaction.atomic():
+            self.run(options['requests'])
+            transaction.set_rollback(True)
+
+        summary = self.recorder.summary()
+        summary['meta'] = {'requests': options['requests'], 'database': connection.vendor}
+        self.report(summary)
+        write_json(options['output'], summary)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, requests):
+        user = User.objects.create_user(username=f'bench_auth_{int(time.time())}', password='bench-pass-123')
+        UserProfile.objects.create(user=user, phone='9999999999', address='Bench Street')
+        token = str(ProfileTokenObtainPairSerializer.get_token(user).access_token)
+        factory = APIRequestFactory()
+
+        for label, (authentication_class, cache_seconds) in AUTHENTICATORS.items():
+            view = ProfileView.as_view(authentication_classes=[authentication_class])
+            active_users.clear()
+            with override_settings(JWT_USER_CACHE_SECONDS=cache_seconds):
+                for _ in range(requests):
+                    request = factory.get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {token}')
+                    self.measure(f'authenticate:{label}', lambda: authentication_class().authenticate(request))
+                    self.measure(f'profile:{label}', lambda: view(request).render())
+
+    def measure(self, label, call):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - started
+        self.recorder.record(label, elapsed, len(queries))
+
+    def report(self, summary):
+        self.stdout.write(f"{'step':<30}{'p50 µs':>10}{'p95 µs':>10}{'queries':>9}")
+        for label, stats in summary['endpoints'].items():
+            self.stdout.write(
+                f"{label:<30}{stats['p50_ms'] * 1000:>10.0f}{stats['p95_ms'] * 1000:>10.0f}"
+                f"{stats['queries_per_request']:>9}"
+            )
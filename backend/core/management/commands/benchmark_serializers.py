@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from core.benchmarking import write_json
+from core.fast_serializers import BusValuesSerializer, RouteValuesSerializer, SeatValuesSerializer
+from core.models import Bus, Route, Seat
+from core.reference_cache import reference_cache
+from core.renderers import FastJSONRenderer, orjson
+from core.serializers import BusSerializer, RouteSerializer, SeatSerializer
+
+# label -> (queryset, DRF serializer, values serializer)
+SUBJECTS = {
+    'routes': (lambda: Route.objects.order_by('departure_time', 'id'), RouteSerializer, RouteValuesSerializer()),
+    'buses': (lambda: Bus.objects.order_by('id'), BusSerializer, BusValuesSerializer()),
+    'seats': (lambda: Seat.objects.order_by('id'), SeatSerializer, SeatValuesSerializer()),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare rows per second of the DRF serializers and the values() fast path on the current dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per batch, like one list page')
+        parser.add_argument('--repeat', type=int, default=200, help='Batches timed per serializer')
+        parser.add_argument('--output', default='benchmark_serializers.json', help='Where to write the JSON results')
+
+    def handle(self, *args, **options):
+        if not Route.objects.exists():
+            raise CommandError("No routes found; seed the database first (manage.py seed_bulk).")
+        for kind in ('city', 'operator', 'bus'):
+            reference_cache.table(kind)
+
+        results = {}
+        rows = options['rows']
+        for label, (queryset, drf_serializer, values_serializer) in SUBJECTS.items():
+            def drf():
+                return JSONRenderer().render(drf_serializer(list(queryset()[:rows]), many=True).data)
+
+            def fast():
+                return FastJSONRenderer().render(values_serializer.serialize(values_serializer.values(queryset()[:rows])))
+
+            count = queryset()[:rows].count()
+            results[label] = {
+                'rows': count,
+                'identical_output': drf() == fast(),
+                'drf_rows_per_second': self.measure(drf, count, options['repeat']),
+                'fast_rows_per_second': self.measure(fast, count, options['repeat']),
+            }
+        results['meta'] = {'rows': options['rows'], 'repeat': options['repeat'], 'orjson': orjson is not None}
+        self.report(results)
+        write_json(options['output'], results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def measure(self, run, rows, repeat):
+        """Rows per second for fetching, serializing and rendering a batch ``repeat`` times."""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = time.perf_counter() - started
+        return round(rows * repeat / elapsed, 1) if elapsed else 0.0
+
+    def report(self, results):
+        self.stdout.write(f"{'subject':<9}{'rows':>6}{'DRF rows/s':>14}{'fast rows/s':>14}{'speedup':>9}  identical")
+        for label in SUBJECTS:
+            stats = results[label]
+            speedup = stats['fast_rows_per_second'] / stats['drf_rows_per_second'] if stats['drf_rows_per_second'] else 0
+            self.stdout.write(
+                f"{label:<9}{stats['rows']:>6}{stats['drf_rows_per_second']:>14.0f}"
+                f"{stats['fast_rows_per_second']:>14.0f}{speedup:>8.1f}x  {stats['identical_output']}"
+            )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.inventory import expire_holds
+
+class Command(BaseCommand):
+    help = 'Release seat holds whose expiry time has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running and sweep every N seconds (default: sweep once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            expired = expire_holds()
+            self.stdout.write(f"Released {expired} expired seat holds")
+            if not interval:
+                break
+            time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS("Expired holds cleared!"))
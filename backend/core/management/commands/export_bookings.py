@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.exports import DEFAULT_CHUNK_SIZE, FORMATS, bookings_on, encode, export_rows
+from core.models import Booking
+from core.search import SearchParamError, date_param
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings with their passengers and seats to CSV or NDJSON without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Bookings made on this local date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--route', type=int, help='Export the confirmed passenger manifest of this route ID instead')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for stdout")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Bookings fetched per query')
+
+    def handle(self, *args, **options):
+        if options['route'] is not None:
+            bookings = Booking.objects.filter(route_id=options['route'], status='Confirmed')
+        else:
+            try:
+                date = date_param(options, 'date', timezone.localdate())
+            except SearchParamError as error:
+                raise CommandError(str(error))
+            bookings = bookings_on(date)
+
+        lines = encode(export_rows(bookings, options['chunk_size']), options['format'])
+        if options['output'] == '-':
+            self.write_lines(self.stdout, lines)
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            count = self.write_lines(output, lines)
+        if options['format'] == 'csv':
+            count -= 1  # header
+        self.stderr.write(f"Wrote {count} rows to {options['output']}")
+
+    def write_lines(self, output, lines):
+        count = 0
+        for line in lines:
+            output.write(line)
+            count += 1
+        return count
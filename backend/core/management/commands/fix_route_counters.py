@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from core.inventory import rebuild_route_counters
+from core.fare_calendar import rebuild_fare_calendar
+
+
+class Command(BaseCommand):
+    help = 'Check the denormalized per-route seat and revenue counters and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many routes drifted')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Routes checked per query')
+
+    def handle(self, *args, **options):
+        drifted = rebuild_route_counters(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = "Would fix" if options['dry_run'] else "Fixed"
+        self.stdout.write(f"{verb} counters on {drifted} routes")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run, nothing was changed."))
+        else:
+            if drifted:
+                rebuild_fare_calendar()
+            self.stdout.write(self.style.SUCCESS("Route counters are consistent!"))
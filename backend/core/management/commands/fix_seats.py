@@ -1,46 +1,56 @@
 from django.core.management.base import BaseCommand
-from core.models import Seat, Booking
-from django.db import transaction
+from core.models import Route
+from core.inventory import reconcile_inventory, rebuild_route_counters, repair_route_counters
+from core.fare_calendar import rebuild_fare_calendar, refresh_routes
+
+# Routes whose calendar days are recomputed per query, keeping each OR of days small
+CALENDAR_CHUNK = 100
 
 class Command(BaseCommand):
-    help = 'Fix seat booking status by ensuring only seats that are actually booked by users are marked as booked'
+    help = 'Fix per-route seat booking status so it matches the seats of non-cancelled bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many seats would change')
+        parser.add_argument('--bus', type=int, help='Only reconcile routes of this bus ID')
+        parser.add_argument('--route', type=int, help='Only reconcile this route ID')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Inventory rows per UPDATE batch')
+        parser.add_argument('--full', action='store_true',
+                            help='Afterwards rebuild every route counter and the whole fare calendar '
+                                 '(the calendar is rewritten in one transaction)')
 
     def handle(self, *args, **options):
         self.stdout.write("Checking and fixing seat booking status...")
-        
-        # Get all seats that are marked as booked
-        booked_seats = Seat.objects.filter(is_booked=True)
-        self.stdout.write(f"Found {booked_seats.count()} seats marked as booked")
-        
-        # Get all actual bookings
-        actual_bookings = Booking.objects.all()
-        self.stdout.write(f"Found {actual_bookings.count()} actual bookings")
-        
-        # Get all seats that are actually booked by users
-        actually_booked_seat_ids = set()
-        for booking in actual_bookings:
-            for seat in booking.seats.all():
-                actually_booked_seat_ids.add(seat.id)
-        
-        self.stdout.write(f"Seats actually booked by users: {len(actually_booked_seat_ids)}")
-        
-        # Fix seats that are marked as booked but not actually booked
-        with transaction.atomic():
-            for seat in booked_seats:
-                if seat.id not in actually_booked_seat_ids:
-                    self.stdout.write(f"Fixing seat {seat.id} (Bus: {seat.bus.bus_number}, Seat: {seat.seat_number}) - marked as booked but not actually booked")
-                    seat.is_booked = False
-                    seat.save()
-        
-        # Double check - mark seats as booked if they are actually booked
-        for booking in actual_bookings:
-            for seat in booking.seats.all():
-                if not seat.is_booked:
-                    self.stdout.write(f"Fixing seat {seat.id} (Bus: {seat.bus.bus_number}, Seat: {seat.seat_number}) - actually booked but not marked as booked")
-                    seat.is_booked = True
-                    seat.save()
-        
-        # Final count
-        final_booked_seats = Seat.objects.filter(is_booked=True).count()
-        self.stdout.write(f"Final count of seats marked as booked: {final_booked_seats}")
-        self.stdout.write(self.style.SUCCESS("Seat booking status fixed!")) 
\ No newline at end of file
+
+        result = reconcile_inventory(
+            route_id=options['route'],
+            bus_id=options['bus'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        verb = "Would fix" if options['dry_run'] else "Fixed"
+        self.stdout.write(f"{verb} {result['freed']} seats marked as booked but not actually booked")
+        self.stdout.write(f"{verb} {result['claimed']} seats actually booked but not marked as booked")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run, nothing was changed."))
+            return
+        if options['full']:
+            rebuild_route_counters(batch_size=options['batch_size'])
+            rebuild_fare_calendar()
+        else:
+            self.repair_reconciled(options)
+        self.stdout.write(self.style.SUCCESS("Seat booking status fixed!"))
+
+    def repair_reconciled(self, options):
+        """Bring the counters and calendar days of the reconciled routes in step, window by window."""
+        routes = Route.objects.all()
+        if options['route'] is not None:
+            routes = routes.filter(id=options['route'])
+        if options['bus'] is not None:
+            routes = routes.filter(bus_id=options['bus'])
+        repaired = 0
+        for route_ids in repair_route_counters(routes, batch_size=options['batch_size']):
+            for start in range(0, len(route_ids), CALENDAR_CHUNK):
+                refresh_routes(route_ids[start:start + CALENDAR_CHUNK])
+            repaired += len(route_ids)
+        self.stdout.write(f"Refreshed counters and fare calendar days of {repaired} routes")
@@ -0,0 +1,72 @@
+import csv
+import sys
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.hashing import hashing_pool
+from core.models import UserProfile
+
+COLUMNS = ['username', 'email', 'password', 'phone', 'address']
+
+
+class Command(BaseCommand):
+    help = 'Create users and their profiles from a CSV file with bulk inserts (agent and corporate onboarding)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help=f"CSV file with a header of {', '.join(COLUMNS)}, or '-' for stdin; "
+                                         "only username is required and users without a password cannot log in")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users hashed and inserted per transaction')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            self.run(sys.stdin, options['batch_size'])
+            return
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as source:
+                self.run(source, options['batch_size'])
+        except OSError as error:
+            raise CommandError(str(error))
+
+    def run(self, source, batch_size):
+        reader = csv.DictReader(source)
+        if 'username' not in (reader.fieldnames or ()):
+            raise CommandError("The CSV needs at least a 'username' column.")
+        created = skipped = 0
+        seen = set()
+        while batch := list(islice(reader, batch_size)):
+            rows = []
+            for row in batch:
+                username = User.normalize_username((row.get('username') or '').strip())
+                if not username or username in seen:
+                    skipped += 1
+                    continue
+                seen.add(username)
+                rows.append((username, row))
+            existing = set(User.objects.filter(username__in=[username for username, _ in rows])
+                           .values_list('username', flat=True))
+            skipped += len(existing)
+            rows = [(username, row) for username, row in rows if username not in existing]
+            if rows:
+                created += self.create(rows)
+            self.stdout.write(f"  {created} users created")
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} users, skipped {skipped} existing, repeated or blank usernames"))
+
+    def create(self, rows):
+        # Hashing dominates an import, so it runs across the pool threads
+        passwords = hashing_pool.map(make_password, [row.get('password') or None for _, row in rows])
+        users = [
+            User(username=username, email=User.objects.normalize_email((row.get('email') or '').strip()),
+                 password=password)
+            for (username, row), password in zip(rows, passwords)
+        ]
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            UserProfile.objects.bulk_create(
+                UserProfile(user_id=user.id, phone=(row.get('phone') or '').strip(),
+                            address=(row.get('address') or '').strip())
+                for user, (_, row) in zip(users, rows)
+            )
+        return len(users)
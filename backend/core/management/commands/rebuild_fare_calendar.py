@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.fare_calendar import rebuild_fare_calendar
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed fare calendar from routes and trip inventory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Calendar rows per INSERT batch')
+
+    def handle(self, *args, **options):
+        written = rebuild_fare_calendar(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Fare calendar rebuilt with {written} days"))
@@ -1,14 +1,16 @@
 from django.core.management.base import BaseCommand
-from core.models import Seat
+from core.models import Route, RouteSeat
+from core.fare_calendar import rebuild_fare_calendar
 
 class Command(BaseCommand):
     help = 'Reset all seats to not booked (for testing purposes)'
 
     def handle(self, *args, **options):
         self.stdout.write("Resetting all seats to not booked...")
-        
-        # Reset all seats to not booked
-        updated_count = Seat.objects.filter(is_booked=True).update(is_booked=False)
-        
-        self.stdout.write(f"Reset {updated_count} seats to not booked")
+
+        # Seats are booked per trip, so resetting the trip inventory frees them all
+        trip_count = RouteSeat.objects.filter(is_booked=True).update(is_booked=False, booking=None)
+        self.stdout.write(f"Reset {trip_count} trip seats to not booked")
+        Route.objects.update(booked_count=0)
+        rebuild_fare_calendar()
         self.stdout.write(self.style.SUCCESS("All seats are now available!")) 
\ No newline at end of file
@@ -0,0 +1,236 @@
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from core.models import City, BusOperator, Bus, Route, Seat, RouteSeat, Booking, Passenger, UserProfile
+from core.search_cache import bump_search_version
+from core.fare_calendar import rebuild_fare_calendar
+from core.inventory import rebuild_route_counters
+
+SOUTH_INDIA_CITIES = [
+    'Bangalore', 'Chennai', 'Hyderabad', 'Kochi', 'Trivandrum', 'Coimbatore', 'Mysore', 'Mangalore',
+    'Madurai', 'Vijayawada', 'Tirupati', 'Pondicherry', 'Salem', 'Erode', 'Calicut', 'Hubli', 'Belgaum',
+]
+
+# bus_type -> (weight, seats on the bus, fare multiplier)
+BUS_TYPES = {
+    'AC': (3, 40, 1.3),
+    'Non-AC': (2, 60, 1.0),
+    'Sleeper': (3, 36, 1.5),
+    'Seater': (2, 50, 0.9),
+}
+
+FIRST_NAMES = ['Arjun', 'Priya', 'Karthik', 'Divya', 'Rahul', 'Anitha', 'Suresh', 'Lakshmi', 'Vijay', 'Meera']
+GENDERS = ['Male', 'Female', 'Other']
+
+
+def insert_rows(model, fields, rows, batch_size=10_000):
+    """
+    Insert plain tuples with executemany. Used for the narrow, high-volume
+    tables where building model instances for bulk_create dominates run time
+    and the generated ids are never needed.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def parse_count(value):
+    """Parse counts such as ``500``, ``20k`` or ``5M``."""
+    value = value.strip().lower().replace('_', '')
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise CommandError(f"Invalid count: {value!r}")
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, reproducible synthetic dataset with bulk inserts for capacity testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cities', type=parse_count, default=500)
+        parser.add_argument('--operators', type=parse_count, default=200)
+        parser.add_argument('--buses', type=parse_count, default=2000)
+        parser.add_argument('--days', type=int, default=30, help='Service days, starting tomorrow')
+        parser.add_argument('--routes-per-day', type=parse_count, default=2000)
+        parser.add_argument('--bookings', type=parse_count, default=100_000)
+        parser.add_argument('--users', type=parse_count, default=10_000)
+        parser.add_argument('--cancel-rate', type=float, default=0.05, help='Share of bookings created as cancelled')
+        parser.add_argument('--seed', type=int, default=42, help='RNG seed; the same seed yields the same data')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Routes generated per transaction')
+
+    def handle(self, *args, **options):
+        if City.objects.exists():
+            raise CommandError("The database already contains cities; seed_bulk expects an empty database.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        cities = self.create_cities(options['cities'])
+        operator_ids = self.create_operators(options['operators'])
+        buses = self.create_buses(options['buses'], operator_ids)
+        user_ids = self.create_users(options['users'])
+        self.create_trips(cities, buses, user_ids, options)
+        self.log(f"Set occupancy counters on {rebuild_route_counters(self.batch_size)} routes")
+        self.log(f"Built {rebuild_fare_calendar()} fare calendar days")
+
+        bump_search_version()
+        self.stdout.write(self.style.SUCCESS(f"Bulk data seeded in {time.monotonic() - started:.1f}s!"))
+
+    def log(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
+
+    def create_cities(self, count):
+        names = SOUTH_INDIA_CITIES[:count] + [f'Town {i:05d}' for i in range(len(SOUTH_INDIA_CITIES), count)]
+        City.objects.bulk_create((City(name=name) for name in names), batch_size=self.batch_size)
+        # Random coordinates over a ~1000 km square drive distances, fares and durations
+        cities = [
+            (city_id, self.rng.uniform(0, 1000), self.rng.uniform(0, 1000))
+            for city_id in City.objects.order_by('id').values_list('id', flat=True)
+        ]
+        self.log(f"Created {len(cities)} cities")
+        return cities
+
+    def create_operators(self, count):
+        BusOperator.objects.bulk_create(
+            (
+                BusOperator(name=f'Operator {i:04d} Travels', contact_email=f'operator{i}@mail.com', phone='9876543210')
+                for i in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        operator_ids = list(BusOperator.objects.order_by('id').values_list('id', flat=True))
+        self.log(f"Created {len(operator_ids)} operators")
+        return operator_ids
+
+    def create_buses(self, count, operator_ids):
+        types = list(BUS_TYPES)
+        weights = [BUS_TYPES[bus_type][0] for bus_type in types]
+        buses = []
+        for i in range(count):
+            bus_type = self.rng.choices(types, weights)[0]
+            buses.append(Bus(
+                operator_id=self.rng.choice(operator_ids),
+                bus_number=f'SB{i:06d}',
+                bus_type=bus_type,
+                total_seats=BUS_TYPES[bus_type][1],
+                rating=round(min(5.0, max(1.0, self.rng.gauss(4.1, 0.4))), 1),
+            ))
+        Bus.objects.bulk_create(buses, batch_size=self.batch_size)
+
+        # bus id -> (bus_type, [seat ids in seat-number order])
+        bus_info = {}
+        for start in range(0, len(buses), self.batch_size):
+            chunk = buses[start:start + self.batch_size]
+            seats = Seat.objects.bulk_create(
+                [Seat(bus_id=bus.id, seat_number=str(n)) for bus in chunk for n in range(1, bus.total_seats + 1)],
+                batch_size=self.batch_size * 10,
+            )
+            offset = 0
+            for bus in chunk:
+                bus_info[bus.id] = (bus.bus_type, [seat.id for seat in seats[offset:offset + bus.total_seats]])
+                offset += bus.total_seats
+        self.log(f"Created {len(buses)} buses with {sum(len(s) for _, s in bus_info.values())} seats")
+        return bus_info
+
+    def create_users(self, count):
+        users = User.objects.bulk_create(
+            (User(username=f'seed_user_{i:07d}', email=f'seed_user_{i}@mail.com', password='!') for i in range(count)),
+            batch_size=self.batch_size,
+        )
+        UserProfile.objects.bulk_create((UserProfile(user_id=user.id) for user in users), batch_size=self.batch_size)
+        self.log(f"Created {len(users)} users")
+        return [user.id for user in users]
+
+    def departure_offset(self):
+        """Minutes after midnight; most buses leave in the evening."""
+        if self.rng.random() < 0.6:
+            return self.rng.randint(18 * 60, 23 * 60 + 45)
+        return self.rng.randint(0, 24 * 60 - 15)
+
+    def create_trips(self, cities, buses, user_ids, options):
+        total_routes = options['days'] * options['routes_per_day']
+        bookings_per_route = options['bookings'] / total_routes if total_routes else 0
+        bus_ids = list(buses)
+        first_day = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        counts = {'routes': 0, 'bookings': 0, 'inventory': 0}
+
+        for start in range(0, total_routes, self.batch_size):
+            with transaction.atomic():
+                routes = []
+                for n in range(start, min(start + self.batch_size, total_routes)):
+                    source, destination = self.rng.sample(cities, 2)
+                    bus_id = self.rng.choice(bus_ids)
+                    distance = math.dist(source[1:], destination[1:]) * 1.3 + 20
+                    multiplier = BUS_TYPES[buses[bus_id][0]][2]
+                    fare = round((150 + distance * 1.1 * multiplier) * self.rng.uniform(0.9, 1.15), -1)
+                    day = first_day + timedelta(days=n // options['routes_per_day'])
+                    departure = day + timedelta(minutes=self.departure_offset())
+                    hours = distance / self.rng.uniform(45, 60)
+                    routes.append(Route(
+                        source_id=source[0], destination_id=destination[0], bus_id=bus_id,
+                        departure_time=departure,
+                        arrival_time=departure + timedelta(minutes=round(hours * 60 / 15) * 15),
+                        fare=Decimal(fare).quantize(Decimal('0.01')),
+                    ))
+                Route.objects.bulk_create(routes)
+                self.create_bookings(routes, buses, user_ids, bookings_per_route, options['cancel_rate'], counts)
+            counts['routes'] += len(routes)
+            self.log(f"Created {counts['routes']}/{total_routes} routes, "
+                     f"{counts['bookings']} bookings, {counts['inventory']} trip seats")
+
+    def create_bookings(self, routes, buses, user_ids, bookings_per_route, cancel_rate, counts):
+        bookings, booking_seats = [], []
+        for route in routes:
+            seat_ids = buses[route.bus_id][1]
+            wanted = int(bookings_per_route) + (self.rng.random() < bookings_per_route % 1)
+            next_seat = 0
+            for _ in range(wanted):
+                size = self.rng.choices((1, 2, 3, 4), (50, 30, 12, 8))[0]
+                if next_seat + size > len(seat_ids):
+                    break
+                cancelled = self.rng.random() < cancel_rate
+                bookings.append(Booking(
+                    user_id=self.rng.choice(user_ids), route_id=route.id,
+                    total_fare=route.fare * size, status='Cancelled' if cancelled else 'Confirmed',
+                ))
+                booking_seats.append((route.id, seat_ids[next_seat:next_seat + size], cancelled))
+                if not cancelled:
+                    next_seat += size
+
+        Booking.objects.bulk_create(bookings, batch_size=self.batch_size * 5)
+        occupied = {}  # (route_id, seat_id) -> booking_id
+        passengers, links = [], []
+        for booking, (route_id, seat_ids, cancelled) in zip(bookings, booking_seats):
+            for seat_id in seat_ids:
+                passengers.append((
+                    booking.id, self.rng.choice(FIRST_NAMES), self.rng.randint(5, 80), self.rng.choice(GENDERS),
+                ))
+                links.append((booking.id, seat_id))
+                if not cancelled:
+                    occupied[(route_id, seat_id)] = booking.id
+        insert_rows(Passenger, ['booking', 'name', 'age', 'gender'], passengers)
+        insert_rows(Booking.seats.through, ['booking', 'seat'], links)
+
+        inventory = [
+            (route.id, seat_id, (route.id, seat_id) in occupied, occupied.get((route.id, seat_id)))
+            for route in routes for seat_id in buses[route.bus_id][1]
+        ]
+        insert_rows(RouteSeat, ['route', 'seat', 'is_booked', 'booking'], inventory)
+        counts['bookings'] += len(bookings)
+        counts['inventory'] += len(inventory)
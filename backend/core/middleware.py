@@ -0,0 +1,77 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from .instrumentation import QueryTimer, registry, track_request
+
+logger = logging.getLogger('core.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Record view name, status, duration, query count and time, serializer time
+    and response size for every request.
+
+    A ``PERF_LOG_SAMPLE_RATE`` share of requests is logged as one JSON line on
+    the ``core.performance`` logger; requests slower than
+    ``PERF_SLOW_REQUEST_MS`` are always logged, together with their SQL.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_timer = QueryTimer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track_request(capture_sql=bool(settings.PERF_SLOW_REQUEST_MS)) as metrics:
+            started = time.perf_counter()
+            with connection.execute_wrapper(self.query_timer):
+                response = self.get_response(request)
+            duration = time.perf_counter() - started
+        return self.finish(request, response, duration, metrics)
+
+    async def __acall__(self, request):
+        with track_request(capture_sql=bool(settings.PERF_SLOW_REQUEST_MS)) as metrics:
+            started = time.perf_counter()
+            with connection.execute_wrapper(self.query_timer):
+                response = await self.get_response(request)
+            duration = time.perf_counter() - started
+        return self.finish(request, response, duration, metrics)
+
+    def finish(self, request, response, duration, metrics):
+        slow_ms = settings.PERF_SLOW_REQUEST_MS
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, duration, metrics, size)
+
+        slow = bool(slow_ms) and duration * 1000 >= slow_ms
+        if slow or random.random() < settings.PERF_LOG_SAMPLE_RATE:
+            record = {
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'db_queries': metrics.queries,
+                'db_ms': round(metrics.db_seconds * 1000, 3),
+                'serializer_ms': round(metrics.serializer_seconds * 1000, 3),
+                'response_bytes': size,
+            }
+            if slow:
+                record['slow'] = True
+                record['sql'] = metrics.sql
+                logger.warning(json.dumps(record))
+            else:
+                logger.info(json.dumps(record))
+        return response
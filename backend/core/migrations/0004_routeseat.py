@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def backfill_route_seats(apps, schema_editor):
+    Route = apps.get_model('core', 'Route')
+    Seat = apps.get_model('core', 'Seat')
+    RouteSeat = apps.get_model('core', 'RouteSeat')
+    Booking = apps.get_model('core', 'Booking')
+
+    seats_by_bus = defaultdict(list)
+    for seat_id, bus_id in Seat.objects.values_list('id', 'bus_id'):
+        seats_by_bus[bus_id].append(seat_id)
+
+    rows = []
+    for route_id, bus_id in Route.objects.values_list('id', 'bus_id').iterator():
+        rows.extend(RouteSeat(route_id=route_id, seat_id=seat_id) for seat_id in seats_by_bus[bus_id])
+        if len(rows) >= BATCH_SIZE:
+            RouteSeat.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    if rows:
+        RouteSeat.objects.bulk_create(rows, ignore_conflicts=True)
+
+    # Mark seats of every non-cancelled booking as booked on that booking's route only.
+    seats_by_booking = defaultdict(list)
+    booking_routes = {}
+    links = (
+        Booking.seats.through.objects.exclude(booking__status='Cancelled')
+        .values_list('booking_id', 'booking__route_id', 'seat_id')
+        .order_by('booking_id')
+    )
+    for booking_id, route_id, seat_id in links.iterator():
+        seats_by_booking[booking_id].append(seat_id)
+        booking_routes[booking_id] = route_id
+    for booking_id, seat_ids in seats_by_booking.items():
+        RouteSeat.objects.filter(
+            route_id=booking_routes[booking_id], seat_id__in=seat_ids, is_booked=False
+        ).update(is_booked=True, booking_id=booking_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_passenger_booking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteSeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_booked', models.BooleanField(default=False)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trip_seats', to='core.booking')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_inventory', to='core.route')),
+                ('seat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trip_inventory', to='core.seat')),
+            ],
+            options={
+                'unique_together': {('route', 'seat')},
+            },
+        ),
+        migrations.RunPython(backfill_route_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_routeseat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routeseat',
+            name='held_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='routeseat',
+            name='hold_token',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
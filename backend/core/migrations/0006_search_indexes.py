@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_routeseat_hold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'booking_date'], name='booking_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['source', 'destination', 'departure_time'], name='route_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(fields=['bus', 'is_booked'], name='seat_bus_booked_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 5000
+
+
+def backfill_fare_calendar(apps, schema_editor):
+    Route = apps.get_model('core', 'Route')
+    FareCalendarDay = apps.get_model('core', 'FareCalendarDay')
+    days = (
+        Route.objects.annotate(date=TruncDate('departure_time'))
+        .values('source_id', 'destination_id', 'date')
+        .annotate(
+            min_fare=Min('fare'),
+            departures=Count('id', distinct=True),
+            seats_left=Count('seat_inventory', filter=Q(seat_inventory__is_booked=False)),
+        )
+        .order_by()
+    )
+    batch = []
+    for row in days.iterator(chunk_size=BATCH_SIZE):
+        batch.append(FareCalendarDay(**row))
+        if len(batch) >= BATCH_SIZE:
+            FareCalendarDay.objects.bulk_create(batch)
+            batch = []
+    FareCalendarDay.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FareCalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('min_fare', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('departures', models.PositiveIntegerField()),
+                ('seats_left', models.IntegerField()),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.city')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.city')),
+            ],
+            options={
+                'unique_together': {('source', 'destination', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_fare_calendar, migrations.RunPython.noop),
+    ]
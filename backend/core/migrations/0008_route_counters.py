@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:09
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def _count(queryset, aggregate):
+    rows = queryset.filter(route_id=OuterRef('id')).order_by().values('route_id').annotate(total=aggregate)
+    return Coalesce(Subquery(rows.values('total')), Value(0), output_field=aggregate.output_field)
+
+
+def backfill_route_counters(apps, schema_editor):
+    Route = apps.get_model('core', 'Route')
+    RouteSeat = apps.get_model('core', 'RouteSeat')
+    Booking = apps.get_model('core', 'Booking')
+    counters = {
+        'seat_count': _count(RouteSeat.objects.all(), Count('id')),
+        'booked_count': _count(RouteSeat.objects.filter(is_booked=True), Count('id')),
+        'revenue': _count(
+            Booking.objects.exclude(status='Cancelled'),
+            Sum('total_fare', output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ),
+    }
+    bounds = Route.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        Route.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_fare_calendar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='booked_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='revenue',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='seat_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_route_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_booking_date_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='seat',
+            name='seat_bus_booked_idx',
+        ),
+        migrations.RemoveField(
+            model_name='seat',
+            name='is_booked',
+        ),
+    ]
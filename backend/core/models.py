@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -38,14 +39,28 @@ class Route(models.Model):
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
     fare = models.DecimalField(max_digits=10, decimal_places=2)
+    # Denormalized from RouteSeat and Booking; see inventory.refresh_route_counters
+    seat_count = models.PositiveIntegerField(default=0, editable=False)
+    booked_count = models.PositiveIntegerField(default=0, editable=False)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['source', 'destination', 'departure_time'], name='route_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.source} to {self.destination} - {self.bus}"
 
+    def clean(self):
+        # Booked trip seats cannot follow the departure to another bus
+        booked = RouteSeat.objects.filter(route_id=self.pk, is_booked=True).exclude(seat__bus_id=self.bus_id)
+        if self.pk and booked.exists():
+            raise ValidationError({'bus': "Seats on this departure are booked; cancel those bookings before changing its bus."})
+
 class Seat(models.Model):
     bus = models.ForeignKey(Bus, on_delete=models.CASCADE)
     seat_number = models.CharField(max_length=10)
-    is_booked = models.BooleanField(default=False)
 
     class Meta:
         unique_together = ['bus', 'seat_number']
@@ -61,9 +76,45 @@ class Booking(models.Model):
     total_fare = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, default='Confirmed')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'booking_date'], name='booking_user_date_idx'),
+            models.Index(fields=['booking_date'], name='booking_date_idx'),  # daily exports
+        ]
+
     def __str__(self):
         return f"Booking {self.id} by {self.user.username}"
 
+class RouteSeat(models.Model):
+    """Occupancy of one physical seat on one departure (trip inventory)."""
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='seat_inventory')
+    seat = models.ForeignKey(Seat, on_delete=models.CASCADE, related_name='trip_inventory')
+    booking = models.ForeignKey(Booking, null=True, blank=True, on_delete=models.SET_NULL, related_name='trip_seats')
+    is_booked = models.BooleanField(default=False)
+    hold_token = models.UUIDField(null=True, blank=True, db_index=True)
+    held_until = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        unique_together = ['route', 'seat']
+
+    def __str__(self):
+        return f"Route {self.route_id} - Seat {self.seat_id} ({'booked' if self.is_booked else 'free'})"
+
+class FareCalendarDay(models.Model):
+    """Cheapest fare, departures and free seats per city pair and local service date."""
+    source = models.ForeignKey(City, related_name='+', on_delete=models.CASCADE)
+    destination = models.ForeignKey(City, related_name='+', on_delete=models.CASCADE)
+    date = models.DateField()
+    min_fare = models.DecimalField(max_digits=10, decimal_places=2)
+    departures = models.PositiveIntegerField()
+    seats_left = models.IntegerField()
+
+    class Meta:
+        unique_together = ['source', 'destination', 'date']
+
+    def __str__(self):
+        return f"{self.source_id} to {self.destination_id} on {self.date}: from {self.min_fare}"
+
 class Passenger(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='passengers')
     name = models.CharField(max_length=100)
@@ -0,0 +1,83 @@
+import json
+from bisect import bisect_left, bisect_right
+
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination used by every list endpoint.
+
+    Pages are fetched with ``WHERE <ordering column> > <cursor position>``
+    instead of OFFSET, so page N costs the same as page 1 when the ordering
+    column is indexed. Views choose their ordering with the usual ``ordering``
+    attribute; ``id`` is appended as a tie-breaker so page boundaries are
+    stable for non-unique columns.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        filter_backends = getattr(view, 'filter_backends', [])
+        if any(issubclass(backend, OrderingFilter) for backend in filter_backends):
+            ordering = super().get_ordering(request, queryset, view)
+        else:
+            ordering = getattr(view, 'ordering', None) or self.ordering
+            ordering = (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id',) if ordering[0].startswith('-') else ('id',)
+        return ordering
+
+
+class SortedListPagination(KeysetPagination):
+    """
+    Keyset pagination over an in-memory list, for endpoints served from the
+    reference cache. ``keys`` are the sort keys of ``items`` in the same
+    order; cursors hold the JSON-encoded key of the page boundary and pages
+    are located with bisect.
+    """
+
+    def paginate_list(self, items, keys, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            start, end = 0, self.page_size
+        else:
+            try:
+                key = tuple(json.loads(cursor.position))
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if keys and not self.matches_key(key, keys[0]):
+                raise NotFound(self.invalid_cursor_message)
+            if cursor.reverse:
+                end = bisect_left(keys, key)
+                start = max(0, end - self.page_size)
+            else:
+                start = bisect_right(keys, key)
+                end = start + self.page_size
+        end = min(end, len(items))
+        self.next_key = keys[end - 1] if end < len(items) else None
+        self.previous_key = keys[start] if 0 < start < len(items) else None
+        return items[start:end]
+
+    @staticmethod
+    def matches_key(key, sample):
+        # A decoded key must compare with the real ones, so bisect can't raise on it
+        return len(key) == len(sample) and all(
+            type(part) is type(expected) for part, expected in zip(key, sample)
+        )
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=json.dumps(self.next_key)))
+
+    def get_previous_link(self):
+        if self.previous_key is None:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=json.dumps(self.previous_key)))
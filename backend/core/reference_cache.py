@@ -0,0 +1,104 @@
+"""
+Process-local cache of the small, rarely changing reference tables.
+
+Cities, operators and buses are loaded once per process as plain dicts keyed
+by id, in the shape their serializers produce, so serializing a route needs
+only the route row. Saving or deleting a row clears its table in the current
+process (see signals.py); other processes pick the change up within
+REFERENCE_CACHE_SECONDS. An id that is missing from a table triggers one
+reload, which covers rows created by another process.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import City, BusOperator, Bus
+
+TABLES = {
+    'city': (City, ('id', 'name')),
+    'operator': (BusOperator, ('id', 'name', 'contact_email', 'phone')),
+    'bus': (Bus, ('id', 'operator_id', 'bus_number', 'bus_type', 'total_seats', 'rating')),
+}
+
+
+class ReferenceCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}  # kind -> (loaded_at, {id: row})
+        self._city_list = (None, [])
+
+    def _fresh(self, kind):
+        entry = self._tables.get(kind)
+        if entry and time.monotonic() - entry[0] < settings.REFERENCE_CACHE_SECONDS:
+            return entry[1]
+        return None
+
+    def _store(self, kind, rows):
+        rows = {row['id']: row for row in rows}
+        self._tables[kind] = (time.monotonic(), rows)
+        return rows
+
+    def table(self, kind):
+        rows = self._fresh(kind)
+        if rows is None:
+            with self._lock:
+                rows = self._fresh(kind)
+                if rows is None:
+                    model, fields = TABLES[kind]
+                    rows = self._store(kind, model.objects.values(*fields))
+        return rows
+
+    async def aload(self, *kinds):
+        """Load stale tables through the async ORM so async views never query from sync code."""
+        for kind in kinds:
+            if self._fresh(kind) is None:
+                model, fields = TABLES[kind]
+                self._store(kind, [row async for row in model.objects.values(*fields)])
+
+    async def aresolve(self, kind, ids):
+        """
+        Load ``kind`` through the async ORM so every id in ``ids`` is served
+        from memory; a table missing one of them is reloaded once, as get() would.
+        """
+        await self.aload(kind)
+        if not self._tables[kind][1].keys() >= set(ids):
+            self.invalidate(kind)
+            await self.aload(kind)
+
+    def get(self, kind, pk):
+        row = self.table(kind).get(pk)
+        if row is None:
+            self.invalidate(kind)
+            row = self.table(kind).get(pk)
+        return row
+
+    def invalidate(self, *kinds):
+        for kind in kinds or list(self._tables):
+            self._tables.pop(kind, None)
+
+    def cities(self):
+        """Every city ordered by (name, id), re-sorted only when the table is reloaded."""
+        table = self.table('city')
+        source, cities = self._city_list
+        if source is not table:
+            cities = sorted(table.values(), key=lambda city: (city['name'], city['id']))
+            self._city_list = (table, cities)
+        return cities
+
+    def city(self, pk):
+        return self.get('city', pk)
+
+    def operator(self, pk):
+        return self.get('operator', pk)
+
+    def bus(self, pk):
+        row = self.get('bus', pk)
+        if row is None:
+            return None
+        bus = {'id': row['id'], 'operator': self.operator(row['operator_id'])}
+        bus.update((key, value) for key, value in row.items() if key not in ('id', 'operator_id'))
+        return bus
+
+
+reference_cache = ReferenceCache()
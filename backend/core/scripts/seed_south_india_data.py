@@ -12,6 +12,6 @@ routes_data = [('Bangalore', 'Chennai', 'B001', 20, 7, 800), ('Chennai', 'Hydera
 
 route_objs = {(src, dst, bus): Route.objects.get_or_create(source=city_objs[src], destination=city_objs[dst], bus=bus_objs[bus], departure_time=datetime.now().replace(hour=dep, minute=0, second=0, microsecond=0)+timedelta(days=1), arrival_time=datetime.now().replace(hour=dep, minute=0, second=0, microsecond=0)+timedelta(days=1)+timedelta(hours=dur), defaults={'fare': Decimal(fare)})[0] for src, dst, bus, dep, dur, fare in routes_data}
 
-[Seat.objects.get_or_create(bus=bus, seat_number=str(i), defaults={'is_booked': False}) for bus in bus_objs.values() for i in range(1, bus.total_seats+1)]
+[Seat.objects.get_or_create(bus=bus, seat_number=str(i)) for bus in bus_objs.values() for i in range(1, bus.total_seats+1)]
 
 print("South India sample data seeded successfully!")
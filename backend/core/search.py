@@ -0,0 +1,81 @@
+"""Parameter parsing and filtering shared by the sync and async route search views."""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+
+class SearchParamError(ValueError):
+    """Raised with a client-facing message when search parameters are invalid."""
+
+
+def parse_search_params(params):
+    """
+    Validate the ``source``, ``destination``, ``date`` and optional ``tz``
+    query parameters. Returns ``(source_id, destination_id, date, tz)``.
+    """
+    date = date_param(params, 'date')
+    source, destination = city_pair_params(params)
+    tz_name = params.get('tz')
+    try:
+        tz = ZoneInfo(tz_name) if tz_name else timezone.get_current_timezone()
+    except (ValueError, ZoneInfoNotFoundError):
+        raise SearchParamError("Unknown time zone.")
+    return source, destination, date, tz
+
+
+def date_param(params, name, default=None):
+    """Read a YYYY-MM-DD query parameter; required unless a default is given."""
+    value = params.get(name)
+    if not value and default is not None:
+        return default
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise SearchParamError("Invalid date format. Use YYYY-MM-DD.")
+
+
+def city_pair_params(params):
+    """Read the required ``source`` and ``destination`` city IDs."""
+    try:
+        return int(params.get('source')), int(params.get('destination'))
+    except (TypeError, ValueError):
+        raise SearchParamError("Source and destination must be city IDs.")
+
+
+def int_param(params, name, default, minimum, maximum):
+    """Read an optional integer query parameter and check it is within [minimum, maximum]."""
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise SearchParamError(f"{name} must be an integer.")
+    if not minimum <= value <= maximum:
+        raise SearchParamError(f"{name} must be between {minimum} and {maximum}.")
+    return value
+
+
+def calendar_dates(start, days):
+    """The ``days`` consecutive dates from ``start``; all of them must be representable."""
+    try:
+        return [start + timedelta(days=offset) for offset in range(days)]
+    except OverflowError:
+        raise SearchParamError("The date range runs past the last supported date.")
+
+
+def search_filter(source, destination, date, tz):
+    """
+    Filter kwargs for routes between two cities departing on a local date.
+
+    Uses a half-open range on the raw column so the (source, destination,
+    departure_time) index can be used; __date would wrap it in a function.
+    """
+    day_start = datetime.combine(date, time.min, tzinfo=tz)
+    return {
+        'source_id': source,
+        'destination_id': destination,
+        'departure_time__gte': day_start,
+        'departure_time__lt': day_start + timedelta(days=1),
+    }
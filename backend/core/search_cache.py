@@ -0,0 +1,71 @@
+"""
+Response cache for RouteViewSet.search.
+
+Entries are keyed on the normalized search parameters plus a global version
+number. Any save or delete of a Route, Bus, BusOperator or City bumps the
+version (see signals.py), which orphans every cached search at once without
+having to know which keys exist. Each entry stores the serialized routes with
+an ETag so unchanged results can be answered with 304 Not Modified.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+VERSION_KEY = 'route_search:version'
+HITS_KEY = 'route_search:hits'
+MISSES_KEY = 'route_search:misses'
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def search_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_search_version():
+    """Invalidate every cached search result."""
+    return _incr(VERSION_KEY)
+
+
+def search_cache_key(source_id, destination_id, date, tz_name, page_params=()):
+    page = ':'.join(str(param) for param in page_params)
+    return f'route_search:v{search_version()}:{source_id}:{destination_id}:{date.isoformat()}:{tz_name}:{page}'
+
+
+def compute_etag(data):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.md5(payload.encode(), usedforsecurity=False).hexdigest()
+
+
+def get_search(key):
+    """Return the cached ``(etag, data)`` pair for key, counting the hit or miss."""
+    entry = cache.get(key)
+    _incr(HITS_KEY if entry is not None else MISSES_KEY)
+    return entry
+
+
+def set_search(key, data):
+    etag = compute_etag(data)
+    cache.set(key, (etag, data), settings.SEARCH_CACHE_TIMEOUT)
+    return etag
+
+
+def search_cache_stats():
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+        'version': search_version(),
+    }
@@ -0,0 +1,78 @@
+"""
+Compact seat maps for the seat selection screen.
+
+A seat map lists the bus layout once as ``[id, seat_number]`` pairs (ordered
+by seat id) and the occupancy of every seat, in the same order, as a
+run-length-encoded string of states: ``F`` free, ``B`` booked and ``H`` held
+by someone else. ``"2B1H37F"`` is two booked seats, one held and 37 free.
+
+Occupancy belongs to a departure, so a bus map carries the layout only.
+Maps are built from a single ``values_list`` query, without model instances
+or serializers, and carry an ETag over the whole payload so an unchanged map
+is answered with 304.
+"""
+from django.utils import timezone
+
+from .models import RouteSeat, Seat
+
+FREE, BOOKED, HELD = 'F', 'B', 'H'
+
+
+def encode_runs(states):
+    """Run-length encode a sequence of one-character states: 'BBF' -> '2B1F'."""
+    runs = []
+    previous, length = None, 0
+    for state in states:
+        if state == previous:
+            length += 1
+            continue
+        if previous is not None:
+            runs.append(f'{length}{previous}')
+        previous, length = state, 1
+    if previous is not None:
+        runs.append(f'{length}{previous}')
+    return ''.join(runs)
+
+
+def decode_runs(encoded):
+    """Inverse of encode_runs: '2B1F' -> 'BBF'."""
+    states, digits = [], ''
+    for char in encoded:
+        if char.isdigit():
+            digits += char
+        else:
+            states.append(char * int(digits))
+            digits = ''
+    return ''.join(states)
+
+
+def _seat_map(rows, **scope):
+    layout, states = [], []
+    for seat_id, seat_number, state in rows:
+        layout.append([seat_id, seat_number])
+        states.append(state)
+    return dict(scope, layout=layout, occupancy=encode_runs(states), available=states.count(FREE))
+
+
+def route_seat_map(route_id, now=None):
+    """Seat map of one departure, from its trip inventory."""
+    now = now or timezone.now()
+    rows = (
+        RouteSeat.objects.filter(route_id=route_id)
+        .order_by('seat_id')
+        .values_list('seat_id', 'seat__seat_number', 'is_booked', 'held_until')
+    )
+    return _seat_map(
+        ((seat_id, number, BOOKED if booked else HELD if held_until and held_until >= now else FREE)
+         for seat_id, number, booked, held_until in rows),
+        route=int(route_id),
+    )
+
+
+def bus_seat_map(bus_id):
+    """
+    Layout of a bus, without occupancy: seats are booked per departure, so a
+    bus on its own has none (ask for a ``route_id`` map instead).
+    """
+    layout = Seat.objects.filter(bus_id=bus_id).order_by('id').values_list('id', 'seat_number')
+    return {'bus': int(bus_id), 'layout': [list(seat) for seat in layout]}
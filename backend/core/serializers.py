@@ -1,129 +1,136 @@
+import logging
+
+from django.conf import settings
 from rest_framework import serializers
 from .models import City, BusOperator, Bus, Route, Seat, Booking, Passenger, UserProfile
+from .inventory import unavailable_seat_ids, claim_seats, adjust_route_counters
+from .exceptions import SeatUnavailable
+from .fare_calendar import adjust_seats
+from .hashing import hash_password
+from .instrumentation import TimedSerializerMixin
+from .reference_cache import reference_cache
 from django.contrib.auth.models import User
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+class ReferenceField(serializers.Field):
+    """Render a foreign key from the process-local reference cache instead of a joined row."""
 
-class CitySerializer(serializers.ModelSerializer):
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return getattr(reference_cache, self.kind)(value)
+
+class CitySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = City
         fields = ['id', 'name']
 
-class BusOperatorSerializer(serializers.ModelSerializer):
+class BusOperatorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = BusOperator
         fields = ['id', 'name', 'contact_email', 'phone']
 
-class BusSerializer(serializers.ModelSerializer):
-    operator = BusOperatorSerializer(read_only=True)
+class BusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    operator = ReferenceField('operator', source='operator_id')
     class Meta:
         model = Bus
         fields = ['id', 'operator', 'bus_number', 'bus_type', 'total_seats', 'rating']
 
-class RouteSerializer(serializers.ModelSerializer):
-    source = CitySerializer(read_only=True)
-    destination = CitySerializer(read_only=True)
-    bus = BusSerializer(read_only=True)
+class RouteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    source = ReferenceField('city', source='source_id')
+    destination = ReferenceField('city', source='destination_id')
+    bus = ReferenceField('bus', source='bus_id')
     class Meta:
         model = Route
         fields = ['id', 'source', 'destination', 'bus', 'departure_time', 'arrival_time', 'fare']
 
-class SeatSerializer(serializers.ModelSerializer):
+class RouteSearchSerializer(RouteSerializer):
+    available_seats = serializers.IntegerField(read_only=True)
+    booked_seats = serializers.IntegerField(read_only=True)
+
+    class Meta(RouteSerializer.Meta):
+        fields = RouteSerializer.Meta.fields + ['available_seats', 'booked_seats']
+
+class SeatSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Seat
-        fields = ['id', 'bus', 'seat_number', 'is_booked']
+        fields = ['id', 'bus', 'seat_number']
 
-class PassengerSerializer(serializers.ModelSerializer):
+class PassengerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Passenger
         fields = ['id', 'name', 'age', 'gender']
 
     def validate(self, data):
-        print(f"Passenger validation data: {data}")
         if not isinstance(data.get('age'), int) or data.get('age') <= 0:
-            print("ERROR: Invalid age")
             raise serializers.ValidationError({"age": "Age must be a positive integer."})
         if data.get('gender') not in ['Male', 'Female', 'Other']:
-            print("ERROR: Invalid gender")
             raise serializers.ValidationError({"gender": "Gender must be Male, Female, or Other."})
-        print("Passenger validation passed!")
         return data
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     seats = SeatSerializer(many=True, read_only=True)
     passengers = PassengerSerializer(many=True, read_only=True)
     route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all(), write_only=True)
     route_details = RouteSerializer(source='route', read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True, allow_null=True)
+    hold_token = serializers.UUIDField(write_only=True, required=False)
 
     class Meta:
         model = Booking
         fields = [
             'id', 'user', 'route', 'route_details', 'seats', 'passengers',
-            'booking_date', 'total_fare', 'status'
+            'booking_date', 'total_fare', 'status', 'hold_token'
         ]
         read_only_fields = ['user', 'booking_date', 'route_details']
 
     def validate(self, data):
-        print("Received data:", self.initial_data)  # Debug
-        
         # Validate that number of passengers matches number of seats
         passengers_data = self.initial_data.get('passengers', [])
         seats_data = self.initial_data.get('seats', [])
-        
-        print(f"Passengers count: {len(passengers_data)}, Seats count: {len(seats_data)}")
-        
+
         if len(passengers_data) != len(seats_data):
-            print("ERROR: Passenger count doesn't match seat count")
             raise serializers.ValidationError("Number of passengers must match number of seats.")
-        
-        # Validate seats
-        route_id = self.initial_data.get('route')
-        if not route_id:
-            print("ERROR: Route ID is missing")
-            raise serializers.ValidationError("Route is required.")
-        
-        print(f"Route ID: {route_id}")
-        route = Route.objects.filter(id=route_id).first()
-        if not route:
-            print("ERROR: Invalid route ID")
-            raise serializers.ValidationError("Invalid route ID.")
-        
-        print(f"Route found: {route}")
-        
-        # Get seat objects and validate them
-        seats = Seat.objects.filter(id__in=seats_data)
-        print(f"Seats found: {seats.count()}, Seats requested: {len(seats_data)}")
-        print(f"Seat IDs requested: {seats_data}")
-        print(f"Seat IDs found: {list(seats.values_list('id', flat=True))}")
-        
-        if len(seats) != len(seats_data):
-            print("ERROR: Some seat IDs are invalid")
+
+        passengers = PassengerSerializer(data=passengers_data, many=True)
+        if not passengers.is_valid():
+            raise serializers.ValidationError({'passengers': passengers.errors})
+        seat_ids = serializers.ListField(child=serializers.IntegerField()).run_validation(seats_data)
+
+        # The route was already resolved by the route field
+        route = data['route']
+
+        # Get seat objects in one query and check ownership by bus_id, without loading each seat's bus
+        seats = {seat.id: seat for seat in Seat.objects.filter(id__in=seat_ids)}
+        if len(seats) != len(seat_ids):
             raise serializers.ValidationError("Some seat IDs are invalid.")
-        
-        print(f"Route bus: {route.bus}, Seat buses: {[seat.bus for seat in seats]}")
-        if not all(seat.bus == route.bus for seat in seats):
-            print("ERROR: Some seats do not belong to the route's bus")
+
+        if any(seat.bus_id != route.bus_id for seat in seats.values()):
             raise serializers.ValidationError("Some seats do not belong to the route's bus.")
-        
-        print(f"Seats booked status: {[seat.is_booked for seat in seats]}")
-        if not all(not seat.is_booked for seat in seats):
-            print("ERROR: Some seats are already booked")
-            raise serializers.ValidationError("Some seats are already booked.")
-        
-        print("All validations passed!")
+
+        unavailable = unavailable_seat_ids(route.id, seat_ids, data.get('hold_token'))
+        if unavailable:
+            logger.info("Booking rejected on route %s: seats %s unavailable", route.id, sorted(unavailable))
+            raise SeatUnavailable("Some seats are already booked or held by another user.")
+
+        data['seat_objects'] = [seats[seat_id] for seat_id in seat_ids]
+        data['passenger_data'] = passengers.validated_data
         return super().validate(data)
 
     def validate_total_fare(self, value):
-        print("Total fare received:", value, "Type:", type(value))  # Debug
-        print("Total fare raw value:", repr(value))  # Debug - show exact value
-        
         # Handle None or empty values
         if value is None or value == '':
             raise serializers.ValidationError("Total fare is required.")
-        
+
         try:
             # Convert to Decimal for proper handling
             from decimal import Decimal, InvalidOperation
-            
+
             if isinstance(value, str):
                 value = Decimal(value.strip())
             elif isinstance(value, (int, float)):
@@ -131,77 +138,102 @@ class BookingSerializer(serializers.ModelSerializer):
             else:
                 # Try to convert any other type
                 value = Decimal(str(value))
-            
-            print("Total fare after conversion:", value, "Type:", type(value))  # Debug
-            
+
             if value <= 0:
                 raise serializers.ValidationError("Total fare must be a positive number.")
-            
+
             return value
         except (ValueError, TypeError, AttributeError, InvalidOperation) as e:
-            print("Total fare validation error:", str(e))  # Debug
+            logger.debug("Total fare validation error for %r: %s", value, e)
             raise serializers.ValidationError(f"Total fare must be a valid number. Received: {repr(value)}")
 
     def create(self, validated_data):
-        print("Starting booking creation...")
-        # Get passengers and seats data from initial_data since they're read_only in validated_data
-        passengers_data = self.initial_data.get('passengers', [])
-        seats_data = self.initial_data.get('seats', [])
-        
-        print(f"Passengers data: {passengers_data}")
-        print(f"Seats data: {seats_data}")
-        print(f"Validated data: {validated_data}")
-        
+        seats = validated_data.pop('seat_objects')
+        passengers_data = validated_data.pop('passenger_data')
+        hold_token = validated_data.pop('hold_token', None)
+        seat_ids = [seat.id for seat in seats]
+
         # Use database transaction to ensure atomicity
-        from django.db import transaction
-        
         with transaction.atomic():
-            # Double-check that seats are still available
-            seats = Seat.objects.filter(id__in=seats_data, is_booked=False)
-            print(f"Available seats found: {seats.count()}")
-            if len(seats) != len(seats_data):
-                print("ERROR: Some seats are no longer available")
-                raise serializers.ValidationError("Some seats are no longer available.")
-            
-            # Create the booking without seats (we'll add them after)
+            # Create the booking first so the seat claim can point at it
             booking = Booking.objects.create(**validated_data)
-            print(f"Booking created with ID: {booking.id}")
-            
-            # Create passengers
-            for passenger_data in passengers_data:
-                print(f"Creating passenger: {passenger_data}")
-                Passenger.objects.create(booking=booking, **passenger_data)
-            
-            # Set seats for the booking
-            booking.seats.set(seats)
-            print(f"Seats set for booking: {list(seats.values_list('id', flat=True))}")
-            
-            # Mark seats as booked
-            for seat in seats:
-                seat.is_booked = True
-                seat.save()
-            print("Seats marked as booked")
-        # Fetch the booking with all related fields for full serialization
-        booking = Booking.objects.prefetch_related('seats', 'passengers').select_related('route__source', 'route__destination', 'route__bus__operator').get(id=booking.id)
-        print("Booking creation completed successfully!")
+
+            # Claim every seat in one conditional UPDATE; a concurrent booking
+            # that got there first leaves us with fewer affected rows.
+            claimed = claim_seats(booking.route_id, seat_ids, booking, hold_token)
+            if claimed != len(seat_ids):
+                logger.info("Booking on route %s lost the race: claimed %s of %s seats",
+                            booking.route_id, claimed, len(seat_ids))
+                raise SeatUnavailable()
+            adjust_route_counters(booking.route_id, claimed, booking.total_fare)
+            adjust_seats(booking.route, -claimed)
+
+            passengers = Passenger.objects.bulk_create(
+                Passenger(booking=booking, **passenger_data) for passenger_data in passengers_data
+            )
+            Booking.seats.through.objects.bulk_create(
+                Booking.seats.through(booking_id=booking.id, seat_id=seat_id) for seat_id in seat_ids
+            )
+
+        # Serialize from the objects already in memory instead of re-fetching
+        booking._prefetched_objects_cache = {'seats': seats, 'passengers': passengers}
+        logger.debug("Booking %s created with seats %s", booking.id, seat_ids)
         return booking
 
-class UserSerializer(serializers.ModelSerializer):
+class JourneySerializer(serializers.Serializer):
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    duration_minutes = serializers.IntegerField()
+    total_fare = serializers.DecimalField(max_digits=10, decimal_places=2)
+    transfers = serializers.IntegerField()
+    legs = RouteSearchSerializer(many=True)
+
+class FareCalendarDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    min_fare = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    departures = serializers.IntegerField()
+    seats_left = serializers.IntegerField()
+
+class SeatHoldSerializer(serializers.Serializer):
+    route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all())
+    seats = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    hold_token = serializers.UUIDField(read_only=True)
+    held_until = serializers.DateTimeField(read_only=True)
+
+    def validate_seats(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Seat IDs must be unique.")
+        return value
+
+class BulkCancelSerializer(serializers.Serializer):
+    booking_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=settings.BOOKING_BATCH_MAX
+    )
+
+class BatchBookingSerializer(serializers.Serializer):
+    bookings = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=settings.BOOKING_BATCH_MAX
+    )
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'password']
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
-        )
-        UserProfile.objects.create(user=user)
+        # Hash before opening the transaction so no connection waits on the hashing pool
+        password = hash_password(validated_data['password'])
+        with transaction.atomic():
+            user = User.objects.create(
+                username=User.normalize_username(validated_data['username']),
+                email=User.objects.normalize_email(validated_data['email']),
+                password=password,
+            )
+            UserProfile.objects.create(user=user)
         return user
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
 
@@ -0,0 +1,80 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import City, BusOperator, Bus, Route, Seat
+from . import connections, fare_calendar, inventory
+from .reference_cache import reference_cache
+from .search_cache import bump_search_version
+
+
+@receiver(post_save, sender=Route)
+def sync_route_inventory(sender, instance, **kwargs):
+    inventory.ensure_route_inventory(instance)
+
+
+@receiver(post_save, sender=Seat)
+def add_seat_inventory(sender, instance, created, **kwargs):
+    if created:
+        inventory.add_seat_to_routes(instance)
+
+
+@receiver([post_save, post_delete], sender=Route)
+@receiver([post_save, post_delete], sender=Bus)
+@receiver([post_save, post_delete], sender=BusOperator)
+@receiver([post_save, post_delete], sender=City)
+def invalidate_route_search(sender, **kwargs):
+    bump_search_version()
+
+
+@receiver([post_save, post_delete], sender=City)
+def invalidate_city_reference(sender, **kwargs):
+    reference_cache.invalidate('city')
+
+
+@receiver([post_save, post_delete], sender=BusOperator)
+def invalidate_operator_reference(sender, **kwargs):
+    reference_cache.invalidate('operator')
+
+
+@receiver([post_save, post_delete], sender=Bus)
+def invalidate_bus_reference(sender, **kwargs):
+    reference_cache.invalidate('bus')
+
+
+@receiver(post_save, sender=Route)
+def update_connection_graphs(sender, instance, **kwargs):
+    connections.route_saved(instance)
+
+
+@receiver(post_delete, sender=Route)
+def remove_from_connection_graphs(sender, instance, **kwargs):
+    connections.route_deleted(instance.id)
+
+
+@receiver(pre_save, sender=Route)
+def remember_previous_route(sender, instance, **kwargs):
+    # The day the route used to count towards and its bus, in case the save changes them
+    previous = Route.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._previous_calendar_key = fare_calendar.calendar_key(previous) if previous else None
+    instance._previous_bus_id = previous.bus_id if previous else None
+
+
+@receiver(pre_save, sender=Route)
+def reject_bus_change_with_bookings(sender, instance, **kwargs):
+    if instance._previous_bus_id not in (None, instance.bus_id):
+        instance.clean()
+
+
+@receiver(post_save, sender=Route)
+def update_fare_calendar(sender, instance, **kwargs):
+    fare_calendar.refresh_days({getattr(instance, '_previous_calendar_key', None), fare_calendar.calendar_key(instance)})
+
+
+@receiver(post_delete, sender=Route)
+def remove_from_fare_calendar(sender, instance, **kwargs):
+    fare_calendar.refresh_days({fare_calendar.calendar_key(instance)})
+
+
+@receiver(post_save, sender=Seat)
+def add_seat_to_fare_calendar(sender, instance, created, **kwargs):
+    if created:
+        fare_calendar.refresh_routes(Route.objects.filter(bus_id=instance.bus_id).values('id'))
@@ -1,3 +1,1346 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from tempfile import TemporaryDirectory
+from threading import Barrier, Thread
+from unittest import mock
+from urllib.parse import urlencode
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .models import City, BusOperator, Bus, Route, Seat, RouteSeat, Booking, UserProfile, FareCalendarDay
+from .authentication import active_users
+from .autocomplete import MAX_RESULTS
+from .benchmarking import load_json, write_json
+from .connections import clear_graphs
+from .hashing import hashing_pool
+from .fast_serializers import BusValuesSerializer, RouteSearchValuesSerializer, RouteValuesSerializer, SeatValuesSerializer
+from .fare_calendar import FIELDS, calendar_key
+from .instrumentation import registry
+from .inventory import availability_annotations, counter_drift, expire_holds, rebuild_route_counters, reconcile_inventory, route_availability
+from .pagination import KeysetPagination
+from .reference_cache import reference_cache
+from .renderers import FastJSONRenderer
+from .search_cache import search_cache_stats
+from .serializers import BusSerializer, RouteSearchSerializer, RouteSerializer, SeatSerializer
+from .seat_map import decode_runs
+from .views import BookingViewSet, metrics_view
+
+
+def create_network(seat_count=4, route_count=2):
+    """Create one bus with seats and several departures between two cities."""
+    source = City.objects.create(name='Bangalore')
+    destination = City.objects.create(name='Chennai')
+    operator = BusOperator.objects.create(name='KPN Travels', contact_email='kpn@mail.com')
+    bus = Bus.objects.create(operator=operator, bus_number='B001', bus_type='AC', total_seats=seat_count)
+    seats = [Seat.objects.create(bus=bus, seat_number=str(i)) for i in range(1, seat_count + 1)]
+    departure = timezone.now().replace(microsecond=0) + timedelta(days=1)
+    routes = [
+        Route.objects.create(
+            source=source, destination=destination, bus=bus,
+            departure_time=departure + timedelta(hours=i),
+            arrival_time=departure + timedelta(hours=i + 7),
+            fare=Decimal('800.00'),
+        )
+        for i in range(route_count)
+    ]
+    return bus, seats, routes
+
+
+# Per-request and booking logs would bury the test output; tests that check
+# them use assertLogs, which sets its own level
+QUIET_LOGGERS = ('core', 'core.performance')
+_saved_levels = {}
+# Logins at Django's full PBKDF2 cost would trip the slow-request log
+_cheap_hashing = override_settings(PASSWORD_HASH_ITERATIONS=1000)
+
+
+def setUpModule():
+    for name in QUIET_LOGGERS:
+        logger = logging.getLogger(name)
+        _saved_levels[name] = logger.level
+        logger.setLevel(logging.WARNING)
+    _cheap_hashing.enable()
+
+
+def tearDownModule():
+    _cheap_hashing.disable()
+    for name, level in _saved_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+def create_user(username='traveller'):
+    user = User.objects.create_user(username=username, email=f'{username}@mail.com')
+    UserProfile.objects.create(user=user)
+    return user
+
+
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def booking_payload(route, seats):
+    return {
+        'route': route.id,
+        'seats': [seat.id for seat in seats],
+        'passengers': [{'name': f'Passenger {i}', 'age': 30, 'gender': 'Male'} for i in range(len(seats))],
+        'total_fare': str(route.fare * len(seats)),
+    }
+
+
+class TripInventoryTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_inventory_created_for_every_route_and_seat(self):
+        self.assertEqual(RouteSeat.objects.count(), len(self.seats) * len(self.routes))
+
+    def test_booking_only_blocks_seat_on_its_own_route(self):
+        first, second = self.routes
+        response = self.client.post('/api/bookings/', booking_payload(first, self.seats[:2]), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        booked = RouteSeat.objects.filter(is_booked=True)
+        self.assertEqual(set(booked.values_list('route_id', flat=True)), {first.id})
+
+        response = self.client.post('/api/bookings/', booking_payload(second, self.seats[:2]), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        response = self.client.post('/api/bookings/', booking_payload(first, self.seats[1:3]), format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_available_seats_by_route(self):
+        first, second = self.routes
+        self.client.post('/api/bookings/', booking_payload(first, self.seats[:1]), format='json')
+        response = self.client.get('/api/seats/available_seats/', {'route_id': first.id})
+        self.assertEqual([seat['id'] for seat in response.data['results']], [seat.id for seat in self.seats[1:]])
+        # Booked state lives on the trip inventory only
+        self.assertEqual(set(response.data['results'][0]), {'id', 'bus', 'seat_number'})
+        response = self.client.get('/api/seats/available_seats/', {'route_id': second.id})
+        self.assertEqual(len(response.data['results']), len(self.seats))
+
+    def test_cancel_frees_trip_seats(self):
+        route = self.routes[0]
+        response = self.client.post('/api/bookings/', booking_payload(route, self.seats[:2]), format='json')
+        booking_id = response.data['id']
+        response = self.client.post(f'/api/bookings/{booking_id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Booking.objects.get(id=booking_id).status, 'Cancelled')
+        self.assertFalse(RouteSeat.objects.filter(route=route, is_booked=True).exists())
+
+    def test_bus_change_moves_inventory_to_the_new_bus(self):
+        route = self.routes[0]
+        other_bus = Bus.objects.create(operator=self.bus.operator, bus_number='KA02', bus_type='AC', total_seats=3)
+        other_seats = [Seat.objects.create(bus=other_bus, seat_number=f'B{n}') for n in range(3)]
+        self.client.post('/api/bookings/hold/', {'route': route.id, 'seats': [self.seats[0].id]}, format='json')
+
+        route.bus = other_bus
+        route.save()
+        self.assertEqual(set(RouteSeat.objects.filter(route=route).values_list('seat_id', flat=True)),
+                         {seat.id for seat in other_seats})
+        route.refresh_from_db()
+        self.assertEqual((route.seat_count, route.booked_count), (3, 0))
+        response = self.client.get('/api/seats/available_seats/', {'route_id': route.id})
+        self.assertEqual([seat['id'] for seat in response.data['results']], [seat.id for seat in other_seats])
+
+    def test_bus_change_rejected_while_seats_are_booked(self):
+        route = self.routes[0]
+        other_bus = Bus.objects.create(operator=self.bus.operator, bus_number='KA02', bus_type='AC', total_seats=1)
+        Seat.objects.create(bus=other_bus, seat_number='B1')
+        self.client.post('/api/bookings/', booking_payload(route, self.seats[:1]), format='json')
+
+        route.bus = other_bus
+        with self.assertRaises(DjangoValidationError):
+            route.save()
+        self.assertEqual(Route.objects.get(id=route.id).bus_id, self.bus.id)
+        self.assertEqual(RouteSeat.objects.filter(route=route).count(), len(self.seats))
+
+    def test_available_seats_requires_a_route(self):
+        self.assertEqual(self.client.get('/api/seats/available_seats/', {'bus_id': self.bus.id}).status_code, 400)
+        self.assertEqual(self.client.get('/api/seats/available_seats/', {'route_id': 'abc'}).status_code, 400)
+
+
+class ReconcileInventoryTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network()
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+        response = self.client.post('/api/bookings/', booking_payload(self.routes[0], self.seats[:2]), format='json')
+        self.booking = Booking.objects.get(id=response.data['id'])
+        # Drift: a booked seat lost its flag, and a free seat got flagged on the other route
+        RouteSeat.objects.filter(route=self.routes[0], seat=self.seats[0]).update(is_booked=False, booking=None)
+        RouteSeat.objects.filter(route=self.routes[1], seat=self.seats[3]).update(is_booked=True)
+
+    def booked(self):
+        return set(RouteSeat.objects.filter(is_booked=True).values_list('route_id', 'seat_id', 'booking_id'))
+
+    def test_dry_run_reports_without_writing(self):
+        before = self.booked()
+        out = StringIO()
+        call_command('fix_seats', '--dry-run', stdout=out)
+        self.assertIn('Would fix 1 seats marked as booked', out.getvalue())
+        self.assertIn('Would fix 1 seats actually booked', out.getvalue())
+        self.assertEqual(self.booked(), before)
+
+    def test_reconcile_fixes_both_directions(self):
+        self.assertEqual(reconcile_inventory(batch_size=3), {'freed': 1, 'claimed': 1})
+        self.assertEqual(self.booked(), {
+            (self.routes[0].id, self.seats[0].id, self.booking.id),
+            (self.routes[0].id, self.seats[1].id, self.booking.id),
+        })
+        self.assertEqual(reconcile_inventory(), {'freed': 0, 'claimed': 0})
+
+    def test_reconcile_scoped_to_route(self):
+        self.assertEqual(reconcile_inventory(route_id=self.routes[1].id), {'freed': 1, 'claimed': 0})
+
+    def test_cancelled_bookings_do_not_hold_seats(self):
+        Booking.objects.filter(id=self.booking.id).update(status='Cancelled')
+        self.assertEqual(reconcile_inventory(bus_id=self.bus.id), {'freed': 2, 'claimed': 0})
+        self.assertEqual(self.booked(), set())
+
+    def test_scoped_fix_repairs_only_reconciled_routes(self):
+        Route.objects.update(booked_count=0)
+        FareCalendarDay.objects.update(seats_left=999)
+        first, second = self.routes
+        with mock.patch('core.management.commands.fix_seats.rebuild_fare_calendar') as rebuild:
+            call_command('fix_seats', '--route', str(first.id), stdout=StringIO())
+        rebuild.assert_not_called()
+
+        self.assertEqual(Route.objects.get(id=first.id).booked_count, 2)
+        self.assertEqual(Route.objects.get(id=second.id).booked_count, 0)  # out of scope, left alone
+        key = calendar_key(first)
+        same_day = [route for route in Route.objects.all() if calendar_key(route) == key]
+        expected = sum(route.seat_count - route.booked_count for route in same_day)
+        self.assertEqual(FareCalendarDay.objects.get(source_id=key[0], destination_id=key[1], date=key[2]).seats_left,
+                         expected)
+
+        with mock.patch('core.management.commands.fix_seats.rebuild_fare_calendar') as rebuild:
+            call_command('fix_seats', '--full', stdout=StringIO())
+        rebuild.assert_called_once()
+        self.assertEqual(Route.objects.get(id=second.id).booked_count, 0)
+        self.assertFalse(counter_drift(Route.objects.all()).exists())
+
+
+
+class RouteCounterTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network()
+        self.route = self.routes[0]
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def counters(self, route=None):
+        return Route.objects.values_list('seat_count', 'booked_count', 'revenue').get(id=(route or self.route).id)
+
+    def test_bookings_and_cancellations_move_counters(self):
+        self.assertEqual(self.counters(), (4, 0, Decimal('0')))
+        first = self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:2]), format='json')
+        second = self.client.post('/api/bookings/', booking_payload(self.route, self.seats[2:3]), format='json')
+        self.assertEqual(self.counters(), (4, 3, Decimal('2400')))
+        self.assertEqual(self.counters(self.routes[1]), (4, 0, Decimal('0')))
+
+        self.client.post(f"/api/bookings/{first.data['id']}/cancel/")
+        self.assertEqual(self.counters(), (4, 1, Decimal('800')))
+        self.client.post('/api/bookings/bulk_cancel/', {'booking_ids': [second.data['id']]}, format='json')
+        self.assertEqual(self.counters(), (4, 0, Decimal('0')))
+
+        Seat.objects.create(bus=self.bus, seat_number='5')
+        self.assertEqual(self.counters(), (5, 0, Decimal('0')))
+
+    def test_racing_cancels_release_a_booking_once(self):
+        self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:1]), format='json')
+        booking = self.client.post('/api/bookings/', booking_payload(self.route, self.seats[1:3]), format='json')
+        # Both requests loaded the booking while it was still confirmed
+        loaded = [Booking.objects.get(id=booking.data['id']) for _ in range(2)]
+        with mock.patch.object(BookingViewSet, 'get_object', side_effect=loaded):
+            self.assertEqual(self.client.post(f"/api/bookings/{booking.data['id']}/cancel/").status_code, 200)
+            self.assertEqual(self.client.post(f"/api/bookings/{booking.data['id']}/cancel/").status_code, 400)
+        self.assertEqual(self.counters(), (4, 1, Decimal('800')))
+
+    def test_availability_reads_counters_and_live_holds(self):
+        self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:1]), format='json')
+        self.client.post('/api/bookings/hold/', {'route': self.route.id, 'seats': [self.seats[1].id]}, format='json')
+        self.assertEqual(route_availability([self.route.id]),
+                         {self.route.id: {'available_seats': 2, 'booked_seats': 1}})
+        RouteSeat.objects.filter(route=self.route).update(held_until=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(route_availability([self.route.id])[self.route.id]['available_seats'], 3)
+
+    def test_fix_route_counters_repairs_drift(self):
+        self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:2]), format='json')
+        Route.objects.filter(id=self.route.id).update(booked_count=0, revenue=0)
+        out = StringIO()
+        call_command('fix_route_counters', '--dry-run', stdout=out)
+        self.assertIn('Would fix counters on 1 routes', out.getvalue())
+        self.assertEqual(self.counters(), (4, 0, Decimal('0')))
+
+        call_command('fix_route_counters', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self.counters(), (4, 2, Decimal('1600')))
+        self.assertEqual(rebuild_route_counters(dry_run=True), 0)
+
+
+class SeedBulkTests(TestCase):
+    def seed(self):
+        call_command(
+            'seed_bulk', '--cities', '20', '--operators', '3', '--buses', '5', '--days', '2',
+            '--routes-per-day', '30', '--bookings', '200', '--users', '10', '--batch-size', '25',
+            stdout=StringIO(),
+        )
+        return list(Route.objects.order_by('id').values_list('source_id', 'destination_id', 'bus_id', 'fare'))
+
+    def test_seeded_data_is_consistent(self):
+        self.seed()
+        self.assertEqual(Route.objects.count(), 60)
+        self.assertAlmostEqual(Booking.objects.count(), 200, delta=30)
+        self.assertEqual(RouteSeat.objects.count(), sum(route.bus.total_seats for route in Route.objects.all()))
+        self.assertEqual(reconcile_inventory(dry_run=True), {'freed': 0, 'claimed': 0})
+
+    def test_same_seed_generates_same_data(self):
+        first = self.seed()
+        for model in (Booking, Route, Seat, Bus, BusOperator, City):
+            model.objects.all().delete()
+        User.objects.all().delete()
+        second = self.seed()
+        self.assertEqual([row[3] for row in first], [row[3] for row in second])
+
+
+class BenchmarkApiTests(TestCase):
+    def test_benchmark_runs_and_flags_regressions(self):
+        create_network(seat_count=10, route_count=3)
+        with TemporaryDirectory() as tmp:
+            output, baseline = f'{tmp}/results.json', f'{tmp}/baseline.json'
+            args = ['benchmark_api', '--iterations', '40', '--users', '1', '--output', output]
+            call_command(*args, stdout=StringIO())
+            summary = load_json(output)
+            self.assertIn('routes-search', summary['endpoints'])
+            self.assertEqual(sum(stats['errors'] for stats in summary['endpoints'].values()), 0)
+            self.assertFalse(Booking.objects.exists())  # in-process runs roll back
+
+            summary['endpoints']['routes-search']['p95_ms'] = 0.0001
+            summary['endpoints']['routes-search']['queries_per_request'] = 0
+            write_json(baseline, summary)
+            with self.assertRaisesMessage(CommandError, 'routes-search'):
+                call_command(*args, '--baseline', baseline, '--min-delta-ms', '0', stdout=StringIO())
+
+
+class BenchmarkAsyncTests(TransactionTestCase):
+    def test_sync_and_async_modes_replay_the_same_requests(self):
+        create_network(seat_count=10, route_count=3)
+        with TemporaryDirectory() as tmp:
+            output = f'{tmp}/results.json'
+            call_command('benchmark_async', '--requests', '30', '--concurrency', '4', '--output', output,
+                         stdout=StringIO())
+            results = load_json(output)
+        for mode in ('sync', 'async'):
+            self.assertEqual(results[mode]['requests'], 30)
+            self.assertEqual(sum(stats['errors'] for stats in results[mode]['endpoints'].values()), 0)
+        self.assertEqual(
+            {label: stats['requests'] for label, stats in results['sync']['endpoints'].items()},
+            {label: stats['requests'] for label, stats in results['async']['endpoints'].items()},
+        )
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=6, route_count=2)
+        self.route = self.routes[0]
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, seats, route=None, client=None):
+        response = (client or self.client).post(
+            '/api/bookings/', booking_payload(route or self.route, seats), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def free_seat_count(self, route):
+        return RouteSeat.objects.filter(route=route, is_booked=False).count()
+
+    def test_batch_create_reports_each_item(self):
+        self.book(self.seats[:1])
+        response = self.client.post('/api/bookings/batch/', {'bookings': [
+            booking_payload(self.route, self.seats[1:3]),
+            booking_payload(self.route, self.seats[:1]),
+            booking_payload(self.routes[1], self.seats[:2]),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 409, 201])
+        self.assertEqual(response.data['results'][0]['booking']['passengers'][0]['name'], 'Passenger 0')
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.free_seat_count(self.route), 3)
+
+    def test_bulk_cancel_frees_seats_and_reports_each_id(self):
+        first = self.book(self.seats[:2])
+        second = self.book(self.seats[2:3])
+        stranger = APIClient()
+        stranger.force_authenticate(create_user('stranger'))
+        foreign = self.book(self.seats[4:5], client=stranger)
+        self.client.post(f'/api/bookings/{second}/cancel/')
+
+        response = self.client.post('/api/bookings/bulk_cancel/', {
+            'booking_ids': [first, second, foreign],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id': first, 'status': 'cancelled'},
+            {'id': second, 'status': 'not_cancellable'},
+            {'id': foreign, 'status': 'not_found'},
+        ])
+        self.assertEqual(Booking.objects.get(id=foreign).status, 'Confirmed')
+        self.assertEqual(self.free_seat_count(self.route), 5)
+
+    def test_route_cancel_requires_staff(self):
+        self.book(self.seats[:2])
+        self.book(self.seats[:2], route=self.routes[1])
+        url = f'/api/routes/{self.route.id}/cancel_bookings/'
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user('ops', is_staff=True))
+        # staff check, route, savepoint, bookings, two UPDATEs, route counters, fare calendar aggregate and
+        # upsert, releases
+        with self.assertNumQueries(12):
+            response = admin.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cancelled'], 1)
+        self.assertEqual(self.free_seat_count(self.route), 6)
+        self.assertEqual(self.free_seat_count(self.routes[1]), 4)
+
+
+
+class BookingExportTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=6, route_count=2)
+        self.route = self.routes[0]
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+        self.admin = APIClient()
+        self.admin.force_authenticate(User.objects.create_user('ops', is_staff=True))
+        self.booking_ids = [
+            self.client.post('/api/bookings/', booking_payload(route, seats), format='json').data['id']
+            for route, seats in ((self.route, self.seats[:2]), (self.route, self.seats[2:3]), (self.routes[1], self.seats[:1]))
+        ]
+        self.client.post(f'/api/bookings/{self.booking_ids[1]}/cancel/')
+
+    def stream(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_manifest_streams_confirmed_passengers_as_csv(self):
+        url = f'/api/routes/{self.route.id}/manifest/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.admin.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'manifest-route-{self.route.id}.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.stream(response))))
+        self.assertEqual([(row['booking_id'], row['seat_number'], row['passenger_name']) for row in rows], [
+            (str(self.booking_ids[0]), '1', 'Passenger 0'),
+            (str(self.booking_ids[0]), '2', 'Passenger 1'),
+        ])
+        self.assertEqual((rows[0]['source'], rows[0]['destination'], rows[0]['total_fare']),
+                         ('Bangalore', 'Chennai', '1600.00'))
+        self.assertEqual(self.admin.get(url, {'fmt': 'xml'}).status_code, 400)
+
+    def test_daily_export_as_ndjson(self):
+        response = self.admin.get('/api/bookings/export/', {'fmt': 'ndjson'})
+        rows = [json.loads(line) for line in self.stream(response).splitlines()]
+        self.assertEqual([row['booking_id'] for row in rows], [self.booking_ids[0]] * 2 + self.booking_ids[1:])
+        self.assertEqual(rows[2]['status'], 'Cancelled')
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.stream(self.admin.get('/api/bookings/export/', {'date': tomorrow, 'fmt': 'ndjson'})), '')
+
+    def test_command_reads_in_chunks(self):
+        with TemporaryDirectory() as directory:
+            output = f'{directory}/bookings.csv'
+            reference_cache.table('city')
+            # one chunk per booking: the booking cursor plus passengers and seats per chunk
+            with self.assertNumQueries(1 + 2 * 3):
+                call_command('export_bookings', '--chunk-size', '1', '--output', output, stderr=StringIO())
+            with open(output, newline='', encoding='utf-8') as exported:
+                rows = list(csv.DictReader(exported))
+        self.assertEqual(len(rows), 4)
+        out = StringIO()
+        call_command('export_bookings', '--route', str(self.route.id), '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class SeatHoldTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(route_count=1)
+        self.route = self.routes[0]
+        self.holder = APIClient()
+        self.holder.force_authenticate(create_user('holder'))
+        self.other = APIClient()
+        self.other.force_authenticate(create_user('other'))
+
+    def hold(self, client, seats):
+        return client.post(
+            '/api/bookings/hold/', {'route': self.route.id, 'seats': [seat.id for seat in seats]}, format='json'
+        )
+
+    def test_hold_blocks_other_users_until_consumed(self):
+        response = self.hold(self.holder, self.seats[:2])
+        self.assertEqual(response.status_code, 201, response.data)
+        hold_token = response.data['hold_token']
+
+        self.assertEqual(self.hold(self.other, self.seats[1:3]).status_code, 409)
+        response = self.other.post('/api/bookings/', booking_payload(self.route, self.seats[:1]), format='json')
+        self.assertEqual(response.status_code, 409)
+        response = self.other.get('/api/seats/available_seats/', {'route_id': self.route.id})
+        self.assertEqual(len(response.data['results']), len(self.seats) - 2)
+
+        payload = dict(booking_payload(self.route, self.seats[:2]), hold_token=hold_token)
+        response = self.holder.post('/api/bookings/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse(RouteSeat.objects.filter(hold_token__isnull=False).exists())
+
+    def test_expired_holds_are_swept(self):
+        self.hold(self.holder, self.seats[:2])
+        RouteSeat.objects.filter(hold_token__isnull=False).update(held_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(expire_holds(), 2)
+        self.assertEqual(self.hold(self.other, self.seats[:2]).status_code, 201)
+
+    def test_release_hold(self):
+        hold_token = self.hold(self.holder, self.seats[:2]).data['hold_token']
+        response = self.holder.post('/api/bookings/release_hold/', {'hold_token': hold_token}, format='json')
+        self.assertEqual(response.data, {'released': 2})
+        self.assertEqual(self.hold(self.other, self.seats[:2]).status_code, 201)
+
+
+
+class SeatMapTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=6, route_count=1)
+        self.route = self.routes[0]
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def test_encodes_layout_and_occupancy_in_one_query(self):
+        self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:2]), format='json')
+        self.client.post('/api/bookings/hold/', {'route': self.route.id, 'seats': [self.seats[4].id]}, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/seats/map/', {'route_id': self.route.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['layout'], [[seat.id, seat.seat_number] for seat in self.seats])
+        self.assertEqual(response.data['occupancy'], '2B2F1H1F')
+        self.assertEqual(decode_runs(response.data['occupancy']), 'BBFFHF')
+        self.assertEqual(response.data['available'], 3)
+
+        self.assertEqual(self.client.get('/api/seats/map/').status_code, 400)
+        self.assertEqual(self.client.get('/api/seats/map/', {'route_id': 999}).status_code, 404)
+
+    def test_bus_map_has_layout_but_no_occupancy(self):
+        self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:1]), format='json')
+        response = self.client.get('/api/seats/map/', {'bus_id': self.bus.id})
+        # A bus has no occupancy of its own; the booking shows on its departure's map only
+        self.assertEqual(response.data, {'bus': self.bus.id, 'layout': [[seat.id, seat.seat_number] for seat in self.seats]})
+        response = self.client.get('/api/seats/map/', {'route_id': self.route.id})
+        self.assertEqual(response.data['occupancy'], '1B5F')
+
+    def test_conditional_get(self):
+        etag = self.client.get('/api/seats/map/', {'route_id': self.route.id})['ETag']
+        response = self.client.get('/api/seats/map/', {'route_id': self.route.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.post('/api/bookings/', booking_payload(self.route, self.seats[:1]), format='json')
+        response = self.client.get('/api/seats/map/', {'route_id': self.route.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['occupancy'], '1B5F')
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel bookings for overlapping seats must never double-book."""
+
+    workers = 8
+
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=6, route_count=1)
+        self.users = [create_user(f'traveller{i}') for i in range(self.workers)]
+
+    def test_parallel_bookings_do_not_double_book(self):
+        route = self.routes[0]
+        barrier = Barrier(self.workers)
+        statuses = []
+
+        def book(user, seats):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                response = client.post('/api/bookings/', booking_payload(route, seats), format='json')
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        # Every worker competes for seat 1; neighbouring workers also overlap on a second seat.
+        threads = [
+            Thread(target=book, args=(user, [self.seats[0], self.seats[1 + i % 5]]))
+            for i, user in enumerate(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(set(statuses)), [201, 409])
+        self.assertEqual(statuses.count(201), 1)
+        confirmed = Booking.objects.filter(route=route, status='Confirmed')
+        self.assertEqual(confirmed.count(), 1)
+        booked = RouteSeat.objects.filter(route=route, is_booked=True)
+        self.assertEqual(
+            set(booked.values_list('seat_id', flat=True)),
+            set(confirmed.get().seats.values_list('id', flat=True)),
+        )
+        self.assertEqual(set(booked.values_list('booking_id', flat=True)), {confirmed.get().id})
+
+
+class AsyncReadEndpointTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=4, route_count=3)
+        client = APIClient()
+        client.force_authenticate(create_user())
+        client.post('/api/bookings/', booking_payload(self.routes[0], self.seats[:1]), format='json')
+        self.params = {
+            'source': self.routes[0].source_id,
+            'destination': self.routes[0].destination_id,
+            'date': timezone.localtime(self.routes[0].departure_time).date().isoformat(),
+        }
+
+    async def test_search_matches_sync_endpoint(self):
+        sync = await self.async_client.get('/api/routes/search/', self.params)
+        response = await self.async_client.get('/api/async/routes/search/', self.params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data.keys(), json.loads(sync.content).keys())
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['results'], json.loads(sync.content)['results'])
+        self.assertEqual(data['results'][0]['available_seats'], 3)
+
+        cached = await self.async_client.get('/api/async/routes/search/', self.params,
+                                             headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_keyset_pages_cover_every_row(self):
+        url, params, names = '/api/async/cities/', {'page_size': 1}, []
+        while url:
+            data = (await self.async_client.get(url, params)).json()
+            names += [city['name'] for city in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(names, ['Bangalore', 'Chennai'])
+
+    async def test_seat_availability_and_errors(self):
+        response = await self.async_client.get('/api/async/seats/available/', {'route_id': self.routes[0].id})
+        self.assertEqual([seat['id'] for seat in response.json()['results']], [seat.id for seat in self.seats[1:]])
+        self.assertEqual((await self.async_client.get('/api/async/seats/available/')).status_code, 400)
+        response = await self.async_client.get('/api/async/routes/search/', dict(self.params, date='tomorrow'))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_malformed_cursors_are_rejected(self):
+        cursors = ['NQ==', '%%%', 'w4g=', _b64('[1]'), _b64('[{"a": 1}, 1]'), _b64('["not a time", 1]')]
+        for cursor in cursors:
+            response = await self.async_client.get('/api/async/routes/search/', dict(self.params, cursor=cursor))
+            self.assertEqual(response.status_code, 400, cursor)
+
+    async def test_search_reloads_reference_data_without_sync_queries(self):
+        # As if the cities were created by another process after this one cached the table
+        reference_cache._store('city', [])
+        response = await self.async_client.get('/api/async/routes/search/', self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['source']['name'], 'Bangalore')
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network()
+        registry.reset()
+
+    def log_records(self, url):
+        with self.assertLogs('core.performance', level='INFO') as logs:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(record.getMessage()) for record in logs.records], response
+
+    @override_settings(PERF_LOG_SAMPLE_RATE=1.0, PERF_SLOW_REQUEST_MS=0)
+    def test_logs_structured_request_metrics(self):
+        with CaptureQueriesContext(connection) as queries:
+            records, response = self.log_records('/api/routes/')
+        record, = records
+        self.assertEqual(record['view'], 'route-list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['db_queries'], len(queries))
+        self.assertEqual(record['response_bytes'], len(response.content))
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertNotIn('sql', record)
+
+    @override_settings(PERF_LOG_SAMPLE_RATE=0.0, PERF_SLOW_REQUEST_MS=1)
+    def test_slow_requests_are_always_logged_with_sql(self):
+        with mock.patch('core.middleware.time') as clock:
+            clock.perf_counter.side_effect = [0.0, 2.0]
+            records, _ = self.log_records('/api/routes/')
+        record, = records
+        self.assertTrue(record['slow'])
+        self.assertEqual(len(record['sql']), record['db_queries'])
+        self.assertIn('core_route', record['sql'][0]['sql'])
+
+    @override_settings(PERF_LOG_SAMPLE_RATE=0.0, PERF_SLOW_REQUEST_MS=0)
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        self.client.get('/api/cities/')
+        response = metrics_view(RequestFactory().get('/api/metrics/'))
+        body = response.content.decode()
+        self.assertIn('busticket_requests_total{view="city-list",method="GET",status="200"} 1', body)
+        self.assertIn('busticket_search_cache_hits', body)
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network()
+
+    def test_routes_render_from_cache_and_saves_invalidate(self):
+        with self.assertNumQueries(4):  # routes, then one load per reference table
+            self.client.get('/api/routes/')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/routes/')
+        self.assertEqual(response.data['results'][0]['bus']['operator']['name'], 'KPN Travels')
+
+        BusOperator.objects.filter(id=self.bus.operator_id).update(name='stale')  # no signal
+        operator = BusOperator.objects.get(id=self.bus.operator_id)
+        operator.name = 'SRS Travels'
+        operator.save()
+        response = self.client.get('/api/routes/')
+        self.assertEqual(response.data['results'][0]['bus']['operator']['name'], 'SRS Travels')
+
+        # Past REFERENCE_CACHE_SECONDS every table is reloaded once
+        with mock.patch('core.reference_cache.time') as clock, self.assertNumQueries(4):
+            clock.monotonic.return_value = 10 ** 9
+            self.client.get('/api/routes/')
+
+    def test_city_list_pages_through_the_cache(self):
+        City.objects.bulk_create(City(name=f'Town {i:02d}') for i in range(5))
+        City.objects.create(name='Bidar')  # the signal clears the cached table
+        names, url = [], '/api/cities/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            names += [city['name'] for city in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, sorted(City.objects.values_list('name', flat=True)))
+
+        previous = self.client.get(response.data['previous']).data['results']
+        self.assertEqual([city['name'] for city in previous], names[3:6])
+
+    def test_city_list_rejects_malformed_cursors(self):
+        City.objects.create(name='Bidar')
+        for position in ('[1]', '["A", {}]', '[1, "A"]', '"A"'):
+            cursor = _b64(urlencode({'p': position}))
+            response = self.client.get('/api/cities/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+
+class CityAutocompleteTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network()
+        for name in ('Chengalpattu', 'Navi Mumbai', 'Chérthala', 'Belgaum'):
+            City.objects.create(name=name)
+
+    def names(self, q, **params):
+        response = self.client.get('/api/cities/autocomplete/', dict(params, q=q))
+        self.assertEqual(response.status_code, 200)
+        return [city['name'] for city in response.data]
+
+    def test_prefix_match_is_case_and_diacritic_insensitive(self):
+        self.assertEqual(self.names('CHER'), ['Chérthala'])
+        self.assertEqual(self.names('mum'), ['Navi Mumbai'])
+        self.assertEqual(self.names('chenn'), ['Chennai'])
+        self.assertEqual(self.names(''), [])
+
+    def test_ranked_by_route_popularity_and_limited(self):
+        # Chennai has routes, so it outranks the other "Ch" towns
+        self.assertEqual(self.names('ch'), ['Chennai', 'Chengalpattu', 'Chérthala'])
+        self.assertEqual(self.names('c', limit=1), ['Chennai'])
+        for limit in (0, -3, 'ten', MAX_RESULTS + 1):
+            response = self.client.get('/api/cities/autocomplete/', {'q': 'c', 'limit': limit})
+            self.assertEqual(response.status_code, 400, limit)
+
+    def test_index_rebuilds_when_a_city_is_saved(self):
+        self.assertEqual(self.names('bel'), ['Belgaum'])
+        city = City.objects.get(name='Belgaum')
+        city.name = 'Belagavi'
+        city.save()
+        self.assertEqual(self.names('bel'), ['Belagavi'])
+        with self.assertNumQueries(0):
+            self.names('bel')
+
+
+class ConnectionSearchTests(TestCase):
+    def setUp(self):
+        clear_graphs()
+        self.cities = {name: City.objects.create(name=name) for name in ('Belgaum', 'Hubli', 'Salem', 'Erode', 'Pondicherry')}
+        operator = BusOperator.objects.create(name='VRL Travels', contact_email='vrl@mail.com')
+        self.bus = Bus.objects.create(operator=operator, bus_number='B100', bus_type='AC', total_seats=2)
+        for n in (1, 2):
+            Seat.objects.create(bus=self.bus, seat_number=str(n))
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.legs = {
+            'belgaum-hubli': self.route('Belgaum', 'Hubli', 8, 10, 200),
+            'hubli-pondy-tight': self.route('Hubli', 'Pondicherry', 10.25, 13, 100),
+            'hubli-pondy': self.route('Hubli', 'Pondicherry', 11, 14, 300),
+            'belgaum-salem': self.route('Belgaum', 'Salem', 7, 9, 100),
+            'salem-erode': self.route('Salem', 'Erode', 10, 11, 100),
+            'erode-pondy': self.route('Erode', 'Pondicherry', 12, 13.5, 100),
+            'direct': self.route('Belgaum', 'Pondicherry', 6, 16, 900),
+        }
+
+    def route(self, source, destination, departs, arrives, fare):
+        midnight = datetime.combine(self.day, time.min, tzinfo=timezone.get_current_timezone())
+        return Route.objects.create(
+            source=self.cities[source], destination=self.cities[destination], bus=self.bus,
+            departure_time=midnight + timedelta(hours=departs), arrival_time=midnight + timedelta(hours=arrives),
+            fare=Decimal(fare),
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/routes/connections/', dict({
+            'source': self.cities['Belgaum'].id,
+            'destination': self.cities['Pondicherry'].id,
+            'date': self.day.isoformat(),
+        }, **params))
+        self.assertEqual(response.status_code, 200, response.data)
+        return [[leg['id'] for leg in journey['legs']] for journey in response.data['results']]
+
+    def ids(self, *names):
+        return [self.legs[name].id for name in names]
+
+    def test_ranks_pareto_journeys_and_respects_layover(self):
+        two_transfers = self.ids('belgaum-salem', 'salem-erode', 'erode-pondy')
+        one_transfer = self.ids('belgaum-hubli', 'hubli-pondy')
+        direct = self.ids('direct')
+        self.assertEqual(self.search(), [two_transfers, one_transfer, direct])
+        self.assertEqual(self.search(sort='fare'), [two_transfers, one_transfer, direct])
+        self.assertEqual(self.search(sort='transfers'), [direct, one_transfer, two_transfers])
+        self.assertEqual(self.search(max_transfers=1), [one_transfer, direct])
+        # A 10 minute layover allows the earlier Hubli bus, which beats both connections
+        self.assertEqual(self.search(min_layover=10), [self.ids('belgaum-hubli', 'hubli-pondy-tight'), direct])
+
+    def test_graph_is_cached_and_updated_incrementally(self):
+        self.search()
+        late = self.route('Belgaum', 'Pondicherry', 9, 12, 1000)
+        with self.assertNumQueries(1):  # seat availability only
+            journeys = self.search(sort='arrival')
+        self.assertEqual(journeys[0], [late.id])
+        late.delete()
+        self.assertNotIn([late.id], self.search())
+
+    def test_skips_journeys_without_enough_seats(self):
+        self.assertEqual(self.search(seats=3), [])
+        self.assertEqual(self.client.get('/api/routes/connections/', {'sort': 'fare'}).status_code, 400)
+
+
+
+class FareCalendarTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, _ = create_network(route_count=0)
+        self.source, self.destination = City.objects.order_by('id')
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.morning = self.route(self.day, 8, '700.00')
+        self.evening = self.route(self.day, 20, '500.00')
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def route(self, day, hour, fare):
+        departure = datetime.combine(day, time(hour), tzinfo=timezone.get_current_timezone())
+        return Route.objects.create(
+            source=self.source, destination=self.destination, bus=self.bus,
+            departure_time=departure, arrival_time=departure + timedelta(hours=3), fare=Decimal(fare),
+        )
+
+    def calendar(self, **params):
+        response = self.client.get('/api/routes/fare-calendar/', dict({
+            'source': self.source.id, 'destination': self.destination.id, 'from': self.day.isoformat(),
+        }, **params))
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def stored(self):
+        return sorted(FareCalendarDay.objects.values_list('source_id', 'destination_id', 'date', *FIELDS))
+
+    def test_returns_every_day_in_range(self):
+        with self.assertNumQueries(1):
+            days = self.calendar(days=3)
+        self.assertEqual([day['date'] for day in days],
+                         [(self.day + timedelta(days=n)).isoformat() for n in range(3)])
+        self.assertEqual(days[0], {'date': self.day.isoformat(), 'min_fare': '500.00', 'departures': 2, 'seats_left': 8})
+        self.assertEqual(days[1], {'date': days[1]['date'], 'min_fare': None, 'departures': 0, 'seats_left': 0})
+        self.assertEqual(len(self.calendar()), 30)
+        self.assertEqual(self.client.get('/api/routes/fare-calendar/', {'source': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/routes/fare-calendar/', {
+            'source': self.source.id, 'destination': self.destination.id, 'days': 91,
+        }).status_code, 400)
+        self.assertEqual(self.client.get('/api/routes/fare-calendar/', {
+            'source': self.source.id, 'destination': self.destination.id, 'from': '9999-12-31', 'days': 5,
+        }).status_code, 400)
+
+    def test_bookings_and_cancellations_update_seats_left(self):
+        response = self.client.post('/api/bookings/', booking_payload(self.morning, self.seats[:2]), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.calendar(days=1)[0]['seats_left'], 6)
+        self.client.post(f"/api/bookings/{response.data['id']}/cancel/")
+        self.assertEqual(self.calendar(days=1)[0]['seats_left'], 8)
+
+        response = self.client.post('/api/bookings/', booking_payload(self.evening, self.seats[:3]), format='json')
+        self.client.post('/api/bookings/bulk_cancel/', {'booking_ids': [response.data['id']]}, format='json')
+        self.assertEqual(self.calendar(days=1)[0]['seats_left'], 8)
+
+    def test_route_changes_move_days_and_match_rebuild(self):
+        self.client.post('/api/bookings/', booking_payload(self.morning, self.seats[:1]), format='json')
+        self.evening.departure_time += timedelta(days=1)
+        self.evening.arrival_time += timedelta(days=1)
+        self.evening.save()
+        days = self.calendar(days=2)
+        self.assertEqual((days[0]['min_fare'], days[0]['departures'], days[0]['seats_left']), ('700.00', 1, 3))
+        self.assertEqual((days[1]['min_fare'], days[1]['departures'], days[1]['seats_left']), ('500.00', 1, 4))
+
+        self.morning.delete()
+        self.assertEqual(self.calendar(days=1)[0]['departures'], 0)
+        incremental = self.stored()
+        call_command('rebuild_fare_calendar', stdout=StringIO())
+        self.assertEqual(self.stored(), incremental)
+
+
+
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(route_count=3)
+        City.objects.filter(name='Chennai').update(name='Tiruchirāppalli \u2028')
+        Bus.objects.filter(id=self.bus.id).update(rating=4.35)
+        Route.objects.filter(id=self.routes[1].id).update(fare=Decimal('799.5'))
+        reference_cache.invalidate()
+
+    def render_both(self, queryset, drf_serializer, values_serializer):
+        drf = JSONRenderer().render(drf_serializer(list(queryset), many=True).data)
+        fast = FastJSONRenderer().render(values_serializer.serialize(values_serializer.values(queryset)))
+        return drf, fast
+
+    def test_values_serializers_render_identical_bytes(self):
+        routes = Route.objects.order_by('id')
+        subjects = [
+            (routes, RouteSerializer, RouteValuesSerializer()),
+            (routes.annotate(**availability_annotations()), RouteSearchSerializer, RouteSearchValuesSerializer()),
+            (Bus.objects.all(), BusSerializer, BusValuesSerializer()),
+            (Seat.objects.all(), SeatSerializer, SeatValuesSerializer()),
+        ]
+        for tz in ('UTC', 'Asia/Kolkata'):
+            with timezone.override(ZoneInfo(tz)):
+                for queryset, drf_serializer, values_serializer in subjects:
+                    drf, fast = self.render_both(queryset, drf_serializer, values_serializer)
+                    self.assertEqual(drf, fast)
+        drf, fast = self.render_both(routes, RouteSerializer, RouteValuesSerializer())
+        self.assertIn('Tiruchirāppalli \\u2028'.encode(), fast)
+
+    def test_renderer_falls_back_without_orjson(self):
+        data = {'when': timezone.now(), 'fare': Decimal('1.50'), 'name': 'Kōchi', 1: [None, 2.5]}
+        expected = JSONRenderer().render(data)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        with mock.patch('core.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_list_endpoints_match_model_serializers(self):
+        response = self.client.get('/api/routes/')
+        self.assertEqual(response.json()['results'],
+                         json.loads(JSONRenderer().render(RouteSerializer(Route.objects.order_by('departure_time'), many=True).data)))
+
+    def test_benchmark_reports_identical_output(self):
+        with TemporaryDirectory() as directory:
+            output = f'{directory}/serializers.json'
+            call_command('benchmark_serializers', '--rows', '3', '--repeat', '2', '--output', output, stdout=StringIO())
+            results = load_json(output)
+        self.assertEqual({label: results[label]['identical_output'] for label in ('routes', 'buses', 'seats')},
+                         {'routes': True, 'buses': True, 'seats': True})
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.user.set_password('secret-pass-1')
+        self.user.save()
+        UserProfile.objects.filter(user=self.user).update(phone='9876543210', address='MG Road')
+        active_users.clear()
+
+    def obtain(self):
+        response = self.client.post('/api/token/', {'username': 'traveller', 'password': 'secret-pass-1'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get(self, url, token):
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_authenticated_reads_need_no_user_lookup(self):
+        access = self.obtain()['access']
+        with self.assertNumQueries(0):
+            response = self.get('/api/profile/', access)
+        self.assertEqual(response.json(), {
+            'username': 'traveller', 'email': 'traveller@mail.com', 'phone': '9876543210', 'address': 'MG Road',
+        })
+        # Only the (empty) bookings page itself
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get('/api/bookings/', access).status_code, 200)
+
+    def test_profile_changes_reach_new_tokens(self):
+        tokens = self.obtain()
+        response = self.client.put('/api/profile/', {'phone': '1234567890'}, content_type='application/json',
+                                   HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('/api/profile/', response.json()['access']).json()['phone'], '1234567890')
+
+        UserProfile.objects.filter(user=self.user).update(address='Brigade Road')
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(self.get('/api/profile/', response.json()['access']).json()['address'], 'Brigade Road')
+
+    def test_refresh_rejects_inactive_users(self):
+        refresh = self.obtain()['refresh']
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+
+    def test_user_cache_locks_out_deactivated_users(self):
+        access = self.obtain()['access']
+        with override_settings(JWT_USER_CACHE_SECONDS=60):
+            with self.assertNumQueries(1):
+                self.get('/api/profile/', access)
+            with self.assertNumQueries(0):
+                self.get('/api/profile/', access)
+            User.objects.filter(id=self.user.id).update(is_active=False)
+            active_users.clear()
+            self.assertEqual(self.get('/api/profile/', access).status_code, 401)
+        # Without the cache the token alone is trusted until it expires
+        self.assertEqual(self.get('/api/profile/', access).status_code, 200)
+
+    def test_staff_endpoints_recheck_the_staff_flag(self):
+        access = self.obtain()['access']
+        self.assertEqual(self.get('/api/bookings/export/', access).status_code, 403)
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        staff_access = self.obtain()['access']
+        self.assertEqual(self.get('/api/bookings/export/', staff_access).status_code, 200)
+
+        # Revoked staff loses access at once, though the token still says is_staff
+        User.objects.filter(id=self.user.id).update(is_staff=False)
+        self.assertEqual(self.get('/api/bookings/export/', staff_access).status_code, 403)
+        other = Booking.objects.create(user=create_user('other'), route=create_network(route_count=1)[2][0],
+                                       total_fare=Decimal('500'))
+        response = self.client.post('/api/bookings/bulk_cancel/', {'booking_ids': [other.id]},
+                                    content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {staff_access}')
+        self.assertEqual(response.json()['results'], [{'id': other.id, 'status': 'not_found'}])
+
+    def test_benchmark_compares_authenticators(self):
+        with TemporaryDirectory() as directory:
+            output = f'{directory}/auth.json'
+            call_command('benchmark_auth', '--requests', '3', '--output', output, stdout=StringIO())
+            endpoints = load_json(output)['endpoints']
+        self.assertEqual(endpoints['authenticate:db-lookup']['queries_per_request'], 1)
+        self.assertEqual(endpoints['authenticate:claims']['queries_per_request'], 0)
+        self.assertEqual(endpoints['profile:claims']['queries_per_request'], 0)
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        hashing_pool.shutdown()
+        self.addCleanup(hashing_pool.shutdown)
+
+    def register(self, username='newcomer'):
+        return self.client.post('/api/register/', {
+            'username': username, 'email': f'{username}@MAIL.com', 'password': 'secret-pass-1',
+        })
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_registration_creates_user_and_profile(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201, response.data)
+        user = User.objects.select_related('userprofile').get(username='newcomer')
+        self.assertEqual(user.email, 'newcomer@mail.com')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(user.check_password('secret-pass-1'))
+        self.assertEqual(user.userprofile.phone, '')
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_failed_profile_rolls_back_the_user(self):
+        with mock.patch.object(UserProfile.objects, 'create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.register()
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0, PASSWORD_HASH_ITERATIONS=1000)
+    def test_full_hashing_pool_fails_fast(self):
+        self.assertEqual(self.register('first').status_code, 201)
+        hashing_pool._slots.acquire()  # a sign-up still hashing
+        try:
+            response = self.register('second')
+        finally:
+            hashing_pool._slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='second').exists())
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_import_users_bulk_creates_users_and_profiles(self):
+        create_user('existing')
+        source = StringIO(
+            'username,email,password,phone,address\n'
+            'agent_1,Agent1@Corp.com,pass-one-1,9000000001,Koramangala\n'
+            'agent_2,,,,\n'
+            'agent_1,dup@corp.com,other,,\n'
+            'existing,,,,\n'
+            ',,,,\n'
+        )
+        out = StringIO()
+        with mock.patch('sys.stdin', source):
+            with self.assertNumQueries(5):  # lookup, savepoint, users, profiles, release
+                call_command('import_users', '-', '--batch-size', '10', stdout=out)
+        self.assertIn('Imported 2 users, skipped 3', out.getvalue())
+        first = User.objects.select_related('userprofile').get(username='agent_1')
+        self.assertEqual((first.email, first.userprofile.phone, first.userprofile.address),
+                         ('Agent1@corp.com', '9000000001', 'Koramangala'))
+        self.assertTrue(first.check_password('pass-one-1'))
+        self.assertFalse(User.objects.get(username='agent_2').has_usable_password())
+
+
+class QueryCountTests(TestCase):
+    """Pin the number of queries per router endpoint so N+1 regressions fail loudly."""
+
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=6, route_count=5)
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for route in self.routes:
+            response = self.client.post('/api/bookings/', booking_payload(route, self.seats[:2]), format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.booking = Booking.objects.filter(user=self.user).first()
+        self.route = self.routes[0]
+        for kind in ('city', 'operator', 'bus'):
+            reference_cache.table(kind)
+
+    def assertQueries(self, expected, url, params=None):
+        with self.assertNumQueries(expected):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def test_cities(self):
+        self.assertQueries(0, '/api/cities/')
+        self.assertQueries(1, f'/api/cities/{self.route.source_id}/')
+
+    def test_operators(self):
+        self.assertQueries(1, '/api/operators/')
+
+    def test_buses(self):
+        self.assertQueries(1, '/api/buses/')
+        self.assertQueries(1, f'/api/buses/{self.bus.id}/')
+
+    def test_routes(self):
+        self.assertQueries(1, '/api/routes/')
+        self.assertQueries(1, f'/api/routes/{self.route.id}/')
+
+    def test_route_search(self):
+        response = self.assertQueries(2, '/api/routes/search/', {
+            'source': self.route.source_id,
+            'destination': self.route.destination_id,
+            'date': timezone.localtime(self.route.departure_time).date().isoformat(),
+        })
+        self.assertTrue(response.data)
+
+    def test_seats(self):
+        self.assertQueries(1, '/api/seats/', {'bus_id': self.bus.id})
+        self.assertQueries(1, '/api/seats/available_seats/', {'route_id': self.route.id})
+
+    def test_bookings(self):
+        self.assertQueries(3, '/api/bookings/')
+        self.assertQueries(3, f'/api/bookings/{self.booking.id}/')
+
+    def test_booking_create_is_constant_in_seat_count(self):
+        # route, seats, availability check, savepoint, booking, claim, route counters, fare calendar,
+        # passengers, seat links, release
+        route = self.routes[1]
+        for seats in (self.seats[2:3], self.seats[3:6]):
+            with self.assertNumQueries(11):
+                response = self.client.post('/api/bookings/', booking_payload(route, seats), format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual([seat['id'] for seat in response.data['seats']], [seat.id for seat in seats])
+            self.assertEqual(len(response.data['passengers']), len(seats))
+            self.assertTrue(all(passenger['id'] for passenger in response.data['passengers']))
+            self.assertEqual(response.data['route_details']['bus']['operator']['id'], self.bus.operator_id)
+
+
+class RouteSearchIndexTests(TestCase):
+    route_count = 5000
+
+    def setUp(self):
+        self.bus, _, _ = create_network(seat_count=1, route_count=0)
+        cities = City.objects.bulk_create(City(name=f'City {i}') for i in range(20))
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        Route.objects.bulk_create(
+            Route(
+                source=cities[i % 20], destination=cities[(i * 7 + 1) % 20], bus=self.bus,
+                departure_time=start + timedelta(minutes=37 * i),
+                arrival_time=start + timedelta(minutes=37 * i + 420),
+                fare=Decimal('500.00'),
+            )
+            for i in range(self.route_count)
+        )
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.route = Route.objects.order_by('id')[self.route_count // 2]
+
+    def test_search_uses_composite_index(self):
+        client = APIClient()
+        date = timezone.localtime(self.route.departure_time).date()
+        response = client.get('/api/routes/search/', {
+            'source': self.route.source_id, 'destination': self.route.destination_id, 'date': date.isoformat(),
+        })
+        self.assertIn(self.route.id, [route['id'] for route in response.data['results']])
+
+        day_start = datetime.combine(date, time.min, tzinfo=timezone.get_current_timezone())
+        plan = Route.objects.filter(
+            source_id=self.route.source_id,
+            destination_id=self.route.destination_id,
+            departure_time__gte=day_start,
+            departure_time__lt=day_start + timedelta(days=1),
+        ).explain()
+        self.assertIn('route_search_idx', plan)
+
+    def test_search_respects_request_time_zone(self):
+        client = APIClient()
+        departure = timezone.localtime(self.route.departure_time, ZoneInfo('Asia/Kolkata'))
+        params = {
+            'source': self.route.source_id, 'destination': self.route.destination_id,
+            'date': departure.date().isoformat(), 'tz': 'Asia/Kolkata',
+        }
+        response = client.get('/api/routes/search/', params)
+        self.assertIn(self.route.id, [route['id'] for route in response.data['results']])
+        response = client.get('/api/routes/search/', dict(params, tz='Not/AZone'))
+        self.assertEqual(response.status_code, 400)
+
+
+class RouteSearchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.bus, self.seats, self.routes = create_network(route_count=1)
+        self.route = self.routes[0]
+        self.client = APIClient()
+        self.params = {
+            'source': self.route.source_id,
+            'destination': self.route.destination_id,
+            'date': timezone.localtime(self.route.departure_time).date().isoformat(),
+        }
+
+    def test_repeat_search_is_served_from_cache(self):
+        first = self.client.get('/api/routes/search/', self.params)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):  # only the live seat counts
+            second = self.client.get('/api/routes/search/', self.params)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(search_cache_stats()['hits'], 1)
+        self.assertEqual(search_cache_stats()['misses'], 1)
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get('/api/routes/search/', self.params)['ETag']
+        response = self.client.get('/api/routes/search/', self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+    def test_reference_data_changes_invalidate_cache(self):
+        etag = self.client.get('/api/routes/search/', self.params)['ETag']
+        self.route.fare = Decimal('750.00')
+        self.route.save()
+        response = self.client.get('/api/routes/search/', self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['fare'], '750.00')
+
+        City.objects.filter(id=self.route.source_id).get().save()
+        self.assertEqual(self.client.get('/api/routes/search/', self.params)['X-Cache'], 'MISS')
+
+    def test_bookings_change_counts_and_etag_without_invalidation(self):
+        first = self.client.get('/api/routes/search/', self.params)
+        self.assertEqual(first.data['results'][0]['available_seats'], len(self.seats))
+        self.assertEqual(first.data['results'][0]['booked_seats'], 0)
+
+        client = APIClient()
+        client.force_authenticate(create_user())
+        client.post('/api/bookings/', booking_payload(self.route, self.seats[:2]), format='json')
+
+        second = self.client.get('/api/routes/search/', self.params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data['results'][0]['available_seats'], len(self.seats) - 2)
+        self.assertEqual(second.data['results'][0]['booked_seats'], 2)
+
+    def test_min_available_is_filtered_in_sql(self):
+        client = APIClient()
+        client.force_authenticate(create_user())
+        client.post('/api/bookings/', booking_payload(self.route, self.seats[:3]), format='json')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/routes/search/', dict(self.params, min_available=1))
+        self.assertEqual(response['X-Cache'], 'BYPASS')
+        self.assertEqual(response.data['results'][0]['available_seats'], 1)
+        response = self.client.get('/api/routes/search/', dict(self.params, min_available=2))
+        self.assertEqual(response.data['results'], [])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.bus, self.seats, self.routes = create_network(seat_count=7, route_count=5)
+        self.client = APIClient()
+
+    def collect(self, url, params):
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200, response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return ids, pages
+            response = self.client.get(response.data['next'])
+
+    def test_seats_are_paged_by_cursor(self):
+        ids, pages = self.collect('/api/seats/', {'bus_id': self.bus.id, 'page_size': 3})
+        self.assertEqual(ids, [seat.id for seat in self.seats])
+        self.assertEqual(pages, 3)
+
+    def test_routes_are_paged_in_departure_order(self):
+        ids, pages = self.collect('/api/routes/', {'page_size': 2})
+        self.assertEqual(ids, [route.id for route in sorted(self.routes, key=lambda r: r.departure_time)])
+        self.assertEqual(pages, 3)
+
+    def test_page_size_is_capped(self):
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get('/api/seats/', {'page_size': 10_000}))
+        self.assertEqual(paginator.get_page_size(request), paginator.max_page_size)
+
+    def test_available_seats_is_paginated(self):
+        response = self.client.get('/api/seats/available_seats/', {'route_id': self.routes[0].id, 'page_size': 4})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNotNone(response.data['next'])
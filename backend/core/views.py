@@ -1,37 +1,119 @@
 from rest_framework import viewsets, filters, generics
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import City, BusOperator, Bus, Route, Seat, Booking
-from .serializers import CitySerializer, BusOperatorSerializer, BusSerializer, RouteSerializer, SeatSerializer, BookingSerializer, UserSerializer, UserProfileSerializer
+from .models import City, BusOperator, Bus, Route, Seat, Booking, FareCalendarDay, UserProfile
+from .authentication import PROFILE_CLAIMS, IsCurrentStaff, access_token_for, staff_confirmed
+from .inventory import unheld, availability_annotations, route_availability, hold_seats, release_hold, release_booking_seats, cancel_bookings, adjust_route_counters
+from .exceptions import SeatUnavailable
+from .fare_calendar import adjust_seats
+from .search import SearchParamError, calendar_dates, city_pair_params, date_param, int_param, parse_search_params, search_filter
+from .connections import RANKINGS, find_connections, journey_fare
+from .search_cache import search_cache_key, get_search, set_search, compute_etag, search_cache_stats
+from .instrumentation import registry
+from .autocomplete import MAX_RESULTS, city_index
+from .pagination import SortedListPagination
+from .seat_map import bus_seat_map, route_seat_map
+from .exports import FORMATS, bookings_on, encode, export_rows
+from .fast_serializers import RouteValuesSerializer, RouteSearchValuesSerializer, BusValuesSerializer, SeatValuesSerializer
+from .reference_cache import reference_cache
+from .serializers import CitySerializer, BusOperatorSerializer, BusSerializer, RouteSerializer, SeatSerializer, JourneySerializer, FareCalendarDaySerializer, BookingSerializer, SeatHoldSerializer, BulkCancelSerializer, BatchBookingSerializer, UserSerializer, UserProfileSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from datetime import datetime
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.http import parse_etags
 from rest_framework import status
 from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import Token
+from django.http import HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from datetime import timedelta
+
+def export_response(bookings, request, filename):
+    """Stream ``bookings`` as a CSV (default) or NDJSON attachment, chosen with ``fmt``."""
+    fmt = request.query_params.get('fmt', 'csv')
+    if fmt not in FORMATS:
+        return Response({"error": f"fmt must be one of {', '.join(FORMATS)}."}, status=400)
+    response = StreamingHttpResponse(encode(export_rows(bookings), fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+class ValuesListMixin:
+    """
+    Serve list pages through a ValuesSerializer (plain ``.values()`` rows)
+    instead of the viewset's ModelSerializer, which still handles writes
+    and single objects.
+    """
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        return self.values_page(self.filter_queryset(self.get_queryset()))
+
+    def values_page(self, queryset, serializer=None):
+        serializer = serializer or self.values_serializer
+        page = self.paginate_queryset(serializer.values(queryset))
+        return self.get_paginated_response(serializer.serialize(page))
 
 class CityViewSet(viewsets.ModelViewSet):
     queryset = City.objects.all()
     serializer_class = CitySerializer
     permission_classes = [AllowAny]
+    pagination_class = SortedListPagination
+
+    def list(self, request, *args, **kwargs):
+        # Served from the process-local reference cache, ordered by name
+        cities = reference_cache.cities()
+        keys = [(city['name'], city['id']) for city in cities]
+        return self.get_paginated_response(self.paginator.paginate_list(cities, keys, request))
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Top cities whose name (or a word in it) starts with ``q``, most-served first."""
+        try:
+            limit = int_param(request.query_params, 'limit', 10, 1, MAX_RESULTS)
+        except SearchParamError as error:
+            return Response({"error": str(error)}, status=400)
+        return Response(city_index().search(request.query_params.get('q', ''), limit))
 
 class BusOperatorViewSet(viewsets.ModelViewSet):
     queryset = BusOperator.objects.all()
     serializer_class = BusOperatorSerializer
     permission_classes = [AllowAny]
 
-class BusViewSet(viewsets.ModelViewSet):
+class BusViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Bus.objects.all()
     serializer_class = BusSerializer
+    values_serializer = BusValuesSerializer()
     permission_classes = [AllowAny]
 
-class RouteViewSet(viewsets.ModelViewSet):
-    queryset = Route.objects.all()
+class RouteViewSet(ValuesListMixin, viewsets.ModelViewSet):
+    queryset = Route.objects.all()  # cities and buses come from the reference cache
     serializer_class = RouteSerializer
+    values_serializer = RouteValuesSerializer()
     permission_classes = [AllowAny]  # Allow search without authentication
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['source', 'destination', 'bus__bus_type', 'fare']
-    ordering_fields = ['fare', 'departure_time', 'bus__rating']
+    ordering_fields = ['fare', 'departure_time']
+    ordering = ['departure_time']
+
+    @action(detail=True, methods=['post'], permission_classes=[IsCurrentStaff])
+    def cancel_bookings(self, request, pk=None):
+        """Cancel every confirmed booking on this departure, e.g. after a breakdown."""
+        route = self.get_object()
+        with transaction.atomic():
+            cancelled = cancel_bookings(Booking.objects.filter(route=route))
+        return Response({'route': route.id, 'cancelled': len(cancelled), 'booking_ids': cancelled},
+                        status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsCurrentStaff])
+    def manifest(self, request, pk=None):
+        """Passenger manifest of this departure (confirmed bookings), streamed as CSV or NDJSON."""
+        route = self.get_object()
+        bookings = Booking.objects.filter(route_id=route.id, status='Confirmed')
+        return export_response(bookings, request, f'manifest-route-{route.id}')
 
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -39,25 +121,142 @@ class RouteViewSet(viewsets.ModelViewSet):
         destination = request.query_params.get('destination')
         date = request.query_params.get('date')
         queryset = self.get_queryset()
-        if source and destination and date:
+        if not (source and destination and date):
+            return self.values_page(queryset)
+
+        try:
+            source, destination, date, tz = parse_search_params(request.query_params)
+        except SearchParamError as error:
+            return Response({"error": str(error)}, status=400)
+        queryset = queryset.filter(**search_filter(source, destination, date, tz))
+
+        min_available = request.query_params.get('min_available')
+        if min_available is not None:
             try:
-                date = datetime.strptime(date, '%Y-%m-%d').date()
-                queryset = queryset.filter(
-                    source__id=source,
-                    destination__id=destination,
-                    departure_time__date=date
-                )
+                min_available = int(min_available)
             except ValueError:
-                return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+                return Response({"error": "min_available must be an integer."}, status=400)
+            # The result set depends on live availability, so filter and count in
+            # SQL and skip the response cache.
+            queryset = queryset.annotate(**availability_annotations()).filter(
+                available_seats__gte=min_available
+            )
+            data = self.values_page(queryset, RouteSearchValuesSerializer()).data
+            etag = compute_etag(data)
+            cache_status = 'BYPASS'
+        else:
+            # Page links are absolute, so the host is part of the page identity
+            page_params = [request.get_host()] + [
+                request.query_params.get(param, '') for param in ('cursor', 'page_size', 'ordering')
+            ]
+            cache_key = search_cache_key(source, destination, date, str(tz), page_params)
+            cached = get_search(cache_key)
+            if cached is not None:
+                etag, data = cached
+                cache_status = 'HIT'
+            else:
+                data = self.values_page(queryset).data
+                etag = set_search(cache_key, data)
+                cache_status = 'MISS'
+
+            # Seat counts change with every booking, so they are layered onto the
+            # cached routes with one grouped query instead of being cached.
+            counts = route_availability([route['id'] for route in data['results']])
+            no_seats = {'available_seats': 0, 'booked_seats': 0}
+            data = dict(data, results=[dict(route, **counts.get(route['id'], no_seats)) for route in data['results']])
+            etag = compute_etag([etag, sorted(counts.items())])
+
+        headers = {'ETag': etag, 'X-Cache': cache_status}
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, headers=headers)
+
+    @action(detail=False, methods=['get'])
+    def connections(self, request):
+        """
+        Journeys with up to ``max_transfers`` changes between two cities on a
+        date, from the in-memory departure graph. Journeys with a leg that has
+        fewer than ``seats`` free seats are left out.
+        """
+        params = request.query_params
+        try:
+            source, destination, date, tz = parse_search_params(params)
+            max_transfers = int_param(params, 'max_transfers', 2, 0, 2)
+            min_layover = int_param(params, 'min_layover', settings.CONNECTION_MIN_LAYOVER_MINUTES, 0, 24 * 60)
+            seats = int_param(params, 'seats', 1, 1, 50)
+            limit = int_param(params, 'limit', 10, 1, 50)
+        except SearchParamError as error:
+            return Response({"error": str(error)}, status=400)
+        sort = params.get('sort', 'arrival')
+        if sort not in RANKINGS:
+            return Response({"error": f"sort must be one of {', '.join(RANKINGS)}."}, status=400)
+
+        journeys = find_connections(source, destination, date, tz, timedelta(minutes=min_layover),
+                                    max_transfers=max_transfers)
+        counts = route_availability({leg.id for legs in journeys for leg in legs})
+        no_seats = {'available_seats': 0, 'booked_seats': 0}
+        journeys = [
+            legs for legs in journeys
+            if all(counts.get(leg.id, no_seats)['available_seats'] >= seats for leg in legs)
+        ]
+        journeys = sorted(journeys, key=RANKINGS[sort])[:limit]
 
-class SeatViewSet(viewsets.ModelViewSet):
+        results = []
+        for legs in journeys:
+            routes = [
+                Route(id=leg.id, source_id=leg.source, destination_id=leg.destination, bus_id=leg.bus_id,
+                      departure_time=leg.departure, arrival_time=leg.arrival, fare=leg.fare)
+                for leg in legs
+            ]
+            for route in routes:
+                for field, value in counts.get(route.id, no_seats).items():
+                    setattr(route, field, value)
+            results.append({
+                'departure_time': legs[0].departure,
+                'arrival_time': legs[-1].arrival,
+                'duration_minutes': int((legs[-1].arrival - legs[0].departure).total_seconds() // 60),
+                'total_fare': journey_fare(legs),
+                'transfers': len(legs) - 1,
+                'legs': routes,
+            })
+        data = JourneySerializer(results, many=True, context=self.get_serializer_context()).data
+        return Response({'count': len(data), 'results': data})
+
+    @action(detail=False, methods=['get'], url_path='fare-calendar')
+    def fare_calendar(self, request):
+        """
+        Cheapest fare, departure count and free seats for each day from
+        ``from`` (default today) for ``days`` days, read from the
+        precomputed calendar. Days without service have a null fare.
+        """
+        params = request.query_params
+        try:
+            source, destination = city_pair_params(params)
+            start = date_param(params, 'from', timezone.localdate())
+            days = int_param(params, 'days', 30, 1, settings.FARE_CALENDAR_MAX_DAYS)
+            dates = calendar_dates(start, days)
+        except SearchParamError as error:
+            return Response({"error": str(error)}, status=400)
+
+        rows = {
+            row['date']: row for row in FareCalendarDay.objects.filter(
+                source_id=source, destination_id=destination, date__gte=dates[0], date__lte=dates[-1],
+            ).values('date', 'min_fare', 'departures', 'seats_left')
+        }
+        calendar = [rows.get(day, {'date': day, 'min_fare': None, 'departures': 0, 'seats_left': 0}) for day in dates]
+        return Response({
+            'source': source,
+            'destination': destination,
+            'results': FareCalendarDaySerializer(calendar, many=True).data,
+        })
+
+class SeatViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Seat.objects.all()
     serializer_class = SeatSerializer
+    values_serializer = SeatValuesSerializer()
     permission_classes = [AllowAny]  # Allow seat viewing without authentication
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['bus', 'is_booked']
+    filterset_fields = ['bus']
 
     def get_queryset(self):
         queryset = Seat.objects.all()
@@ -68,37 +267,155 @@ class SeatViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def available_seats(self, request):
-        bus_id = request.query_params.get('bus_id')
-        if bus_id:
-            queryset = self.get_queryset().filter(bus__id=bus_id, is_booked=False)
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
-        return Response({"error": "Bus ID required."}, status=400)
+        # Availability is per departure: seats of the route's bus neither booked nor held on this trip
+        route_id = request.query_params.get('route_id', '')
+        if not route_id.isdigit():
+            return Response({"error": "Route ID required."}, status=400)
+        queryset = Seat.objects.filter(
+            unheld(prefix='trip_inventory__'),
+            trip_inventory__route_id=route_id,
+            trip_inventory__is_booked=False,
+        ).order_by('id')
+        return self.values_page(queryset)
+
+    @action(detail=False, methods=['get'], url_path='map')
+    def seat_map(self, request):
+        """
+        Compact seat map of a departure (``route_id``): the layout once plus
+        run-length-encoded occupancy, with an ETag. ``bus_id`` gives the layout only.
+        """
+        route_id = request.query_params.get('route_id', '')
+        bus_id = request.query_params.get('bus_id', '')
+        if route_id.isdigit():
+            data = route_seat_map(route_id)
+        elif bus_id.isdigit():
+            data = bus_seat_map(bus_id)
+        else:
+            return Response({"error": "Route ID or bus ID required."}, status=400)
+        if not data['layout']:
+            return Response({"error": "No seats found."}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = compute_etag(data)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
 
 class BookingViewSet(viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]  # Restrict to logged-in users
+    ordering = '-booking_date'  # served by the (user, booking_date) index
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)  # Use authenticated user
+        serializer.save(user_id=self.request.user.id)  # Use authenticated user
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user)
+        return Booking.objects.filter(user_id=self.request.user.id).select_related('route').prefetch_related(
+            'seats', 'passengers'
+        )
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         booking = self.get_object()
-        if booking.status != 'Confirmed':
+        with transaction.atomic():
+            # Conditional UPDATE so concurrent cancels of one booking release it only once
+            cancelled = Booking.objects.filter(pk=booking.pk, status='Confirmed').update(status='Cancelled')
+            if cancelled:
+                # Free the seats on this booking's trip only
+                released = release_booking_seats(booking)
+                adjust_route_counters(booking.route_id, -released, -booking.total_fare)
+                adjust_seats(booking.route, released)
+        if not cancelled:
             return Response({'error': 'Only confirmed bookings can be cancelled.'}, status=status.HTTP_400_BAD_REQUEST)
-        booking.status = 'Cancelled'
-        booking.save()
-        # Mark all associated seats as available
-        for seat in booking.seats.all():
-            seat.is_booked = False
-            seat.save()
         return Response({'success': 'Booking cancelled successfully.'}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsCurrentStaff])
+    def export(self, request):
+        """Every booking made on ``date`` (default today), streamed as CSV or NDJSON."""
+        try:
+            date = date_param(request.query_params, 'date', timezone.localdate())
+        except SearchParamError as error:
+            return Response({"error": str(error)}, status=400)
+        return export_response(bookings_on(date), request, f'bookings-{date.isoformat()}')
+
+    @action(detail=False, methods=['post'])
+    def hold(self, request):
+        """Reserve seats on a route for SEAT_HOLD_MINUTES; pass the token back when booking."""
+        serializer = SeatHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        route = serializer.validated_data['route']
+        seat_ids = serializer.validated_data['seats']
+        hold = hold_seats(route.id, seat_ids)
+        if hold is None:
+            raise SeatUnavailable("Some seats are already booked or held by another user.")
+        hold_token, held_until = hold
+        data = SeatHoldSerializer({
+            'route': route, 'seats': seat_ids, 'hold_token': hold_token, 'held_until': held_until,
+        }).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def release_hold(self, request):
+        hold_token = request.data.get('hold_token')
+        if not hold_token:
+            return Response({'error': 'Hold token required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            released = release_hold(hold_token)
+        except ValidationError:
+            return Response({'error': 'Invalid hold token.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'released': released}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def bulk_cancel(self, request):
+        """Cancel a list of bookings in one transaction; staff may cancel any user's bookings."""
+        serializer = BulkCancelSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        booking_ids = serializer.validated_data['booking_ids']
+
+        bookings = Booking.objects.filter(id__in=booking_ids)
+        if not staff_confirmed(request.user):
+            bookings = bookings.filter(user_id=request.user.id)
+        with transaction.atomic():
+            found = dict(bookings.values_list('id', 'status'))
+            cancelled = set(cancel_bookings(bookings))
+
+        results = []
+        for booking_id in booking_ids:
+            if booking_id in cancelled:
+                outcome = 'cancelled'
+            elif booking_id in found:
+                outcome = 'not_cancellable'
+            else:
+                outcome = 'not_found'
+            results.append({'id': booking_id, 'status': outcome})
+        return Response({'cancelled': len(cancelled), 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Create several bookings in one transaction for group and agent sales.
+
+        Every item is a regular booking payload and gets its own result; a
+        failing item is rolled back to its savepoint without affecting the rest.
+        """
+        serializer = BatchBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = []
+        with transaction.atomic():
+            for index, item in enumerate(serializer.validated_data['bookings']):
+                booking = BookingSerializer(data=item, context=self.get_serializer_context())
+                try:
+                    with transaction.atomic():
+                        booking.is_valid(raise_exception=True)
+                        booking.save(user_id=request.user.id)
+                except APIException as error:
+                    results.append({'index': index, 'status': error.status_code, 'errors': error.detail})
+                else:
+                    results.append({'index': index, 'status': status.HTTP_201_CREATED, 'booking': booking.data})
+        created = sum(result['status'] == status.HTTP_201_CREATED for result in results)
+        return Response({'created': created, 'results': results}, status=status.HTTP_200_OK)
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -108,14 +425,31 @@ class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        profile = request.user.userprofile
+        # Answered from the access token's claims when it carries them
+        claims = getattr(request.user, 'token', None)
+        if claims is not None and all(claim in claims for claim in PROFILE_CLAIMS):
+            return Response({field: claims[field] for field in UserProfileSerializer.Meta.fields})
+        profile = UserProfile.objects.select_related('user').get(user_id=request.user.id)
         serializer = UserProfileSerializer(profile)
         return Response(serializer.data)
 
     def put(self, request):
-        profile = request.user.userprofile
+        profile = UserProfile.objects.select_related('user').get(user_id=request.user.id)
         serializer = UserProfileSerializer(profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=400)
\ No newline at end of file
+            data = serializer.data
+            if isinstance(request.auth, Token):
+                # The caller's token still carries the old profile; hand back one with the new claims
+                data = dict(data, access=str(access_token_for(profile.user)))
+            return Response(data)
+        return Response(serializer.errors, status=400)
+
+def metrics_view(request):
+    """Request counters and search cache stats in the Prometheus text format."""
+    stats = search_cache_stats()
+    body = registry.render(extra=[
+        ('busticket_search_cache_hits', stats['hits']),
+        ('busticket_search_cache_misses', stats['misses']),
+    ])
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')